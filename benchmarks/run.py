@@ -0,0 +1,148 @@
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from jink import __version__, cache
+from jink.lexer import Lexer
+from jink.parser import Parser
+from jink.optimizer import Optimizer, LEVEL
+from jink.interpreter import Interpreter, Environment
+from jink.closures import ClosureCompiler
+from jink.vm import VM
+from jink.modules import AST_CACHE
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+
+# Programs run by default, in order; the mod_* files are only there to be imported
+BENCHMARKS = ('recursion', 'loops', 'strings', 'calls', 'scopes', 'imports')
+PHASES = ('lex', 'parse', 'optimize', 'evaluate')
+BACKENDS = {
+  'interpreter': Interpreter,
+  'closures': ClosureCompiler,
+  'vm': VM
+}
+
+# Slowdown, as a fraction of the old time, reported as a regression
+THRESHOLD = 0.1
+
+# Phases faster than this in both runs are too noisy to compare
+MIN_TIME = 0.001
+
+# Time each phase of one run of a benchmark, in seconds.
+# Every run starts cold: no cached modules and output thrown away.
+def run_once(path, backend, level):
+  code = path.read_text()
+  times = {}
+
+  start = time.perf_counter()
+  tokens = Lexer().tokenize(code)
+  times['lex'] = time.perf_counter() - start
+
+  start = time.perf_counter()
+  ast = Parser().parse(tokens)
+  times['parse'] = time.perf_counter() - start
+
+  start = time.perf_counter()
+  ast = Optimizer(prune=True, level=level).optimize(ast)
+  times['optimize'] = time.perf_counter() - start
+
+  AST_CACHE.clear()
+  env = Environment()
+  env.add_builtins()
+  with contextlib.redirect_stdout(io.StringIO()):
+    start = time.perf_counter()
+    BACKENDS[backend]().evaluate(ast, env, file_dir=path.parent)
+    times['evaluate'] = time.perf_counter() - start
+
+  return times
+
+def run_benchmarks(names, backend='interpreter', level=LEVEL, repeat=5):
+  enabled, cache.ENABLED = cache.ENABLED, False
+  results = {}
+  try:
+    for name in names:
+      runs = [run_once(BENCHMARK_DIR / f"{name}.jk", backend, level) for _ in range(repeat)]
+      results[name] = {}
+      for phase in PHASES + ('total',):
+        if phase == 'total':
+          times = sorted(sum(run.values()) for run in runs)
+        else:
+          times = sorted(run[phase] for run in runs)
+        results[name][phase] = { 'min': times[0], 'median': times[len(times) // 2], 'runs': times }
+  finally:
+    cache.ENABLED = enabled
+
+  return {
+    'jink': __version__,
+    'python': platform.python_version(),
+    'backend': backend,
+    'level': level,
+    'repeat': repeat,
+    'benchmarks': results
+  }
+
+# Rows of (benchmark, phase, old, new, change) for what both results measured, using
+# each phase's fastest run. change is the slowdown as a fraction of the old time.
+def compare(old, new):
+  rows = []
+  for name, phases in new['benchmarks'].items():
+    if name not in old['benchmarks']:
+      continue
+    for phase in PHASES + ('total',):
+      before, after = old['benchmarks'][name][phase]['min'], phases[phase]['min']
+      rows.append((name, phase, before, after, (after - before) / before if before else 0.0))
+  return rows
+
+def regressions(rows, threshold=THRESHOLD):
+  return [row for row in rows if row[4] > threshold and max(row[2], row[3]) >= MIN_TIME]
+
+def format_results(results):
+  lines = [f"jink {results['jink']}, python {results['python']}, {results['backend']} at -O{results['level']}, best of {results['repeat']}"]
+  lines.append(f"{'benchmark':<12}" + ''.join(f"{phase:>12}" for phase in PHASES + ('total',)))
+  for name, phases in results['benchmarks'].items():
+    lines.append(f"{name:<12}" + ''.join(f"{phases[phase]['min'] * 1000:>9.1f} ms" for phase in PHASES + ('total',)))
+  return '\n'.join(lines)
+
+def format_comparison(rows, threshold=THRESHOLD):
+  flagged = regressions(rows, threshold)
+  lines = [f"{'benchmark':<12}{'phase':<10}{'old':>12}{'new':>12}{'change':>10}"]
+  for row in rows:
+    name, phase, before, after, change = row
+    mark = '  REGRESSION' if row in flagged else ''
+    lines.append(f"{name:<12}{phase:<10}{before * 1000:>9.1f} ms{after * 1000:>9.1f} ms{change:>+10.1%}{mark}")
+  lines.append(f"{len(flagged)} regression(s) over {threshold:.0%}")
+  return '\n'.join(lines)
+
+def main(argv):
+  parser = argparse.ArgumentParser(description="Time Jink's front end and backends on the programs in benchmarks/.")
+  parser.add_argument('names', nargs='*', default=BENCHMARKS, help="benchmarks to run (default: all)")
+  parser.add_argument('--backend', choices=BACKENDS, default='interpreter')
+  parser.add_argument('-O', dest='level', type=int, default=LEVEL, help="optimization level")
+  parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark")
+  parser.add_argument('--output', type=Path, help="write the results to this JSON file")
+  parser.add_argument('--compare', nargs=2, type=Path, metavar=('OLD', 'NEW'), help="compare two result files")
+  parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown flagged as a regression, as a fraction")
+  args = parser.parse_args(argv)
+
+  # Exits with 1 when anything got slower than the threshold allows
+  if args.compare:
+    old, new = (json.loads(path.read_text()) for path in args.compare)
+    rows = compare(old, new)
+    print(format_comparison(rows, args.threshold))
+    return 1 if regressions(rows, args.threshold) else 0
+
+  results = run_benchmarks(args.names, args.backend, args.level, args.repeat)
+  print(format_results(results))
+  if args.output:
+    args.output.write_text(json.dumps(results, indent=2))
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv[1:]))
@@ -7,7 +7,16 @@ from jink.lexer import Lexer
 from jink.parser import Parser
 from jink.optimizer import Optimizer
 from jink.interpreter import Interpreter, Environment
+from jink.closures import ClosureCompiler
+from jink.vm import VM
+from jink.resolver import Resolver
 from jink.repl import REPL
+from jink.utils.source import read_source
+from jink import cache
+from jink.memo import Memo
+from jink.profiler import Profiler
+from jink.tracing import Tracer, TracedEnvironment, TracingInterpreter, EVENT_NAMES
+from jink.batch import find_scripts, run_batch, format_results
 # from jink.compiler import Compiler
 
 help_str = '\n'.join([
@@ -16,12 +25,25 @@ help_str = '\n'.join([
   "",
   "args:",
   "  > -v -- verbose; will output AST." # and if compiling, both optimized and unoptimized LLVM IR.",
+  "  > --closures -- compile the AST to closures before running it instead of walking it.",
+  "  > --vm -- compile the AST to bytecode and run it on the stack VM.",
+  "  > --resolve -- address variables by frame slot before interpreting; scoping becomes lexical (interpreter only).",
+  "  > --stream -- read, parse and run the file one top level statement at a time (not with --resolve).",
+  "  > --no-cache -- don't read or write optimized ASTs in __jinkcache__ directories.",
+  "  > --memo -- cache results of functions that only depend on their arguments; -v shows the hit rate (interpreter only).",
+  "  > --profile -- print calls and time spent per function and write folded stacks to <file>.folded (not with --vm).",
+  "  > --trace[=events] -- print events to stderr; comma separated from lookup, set, call, import and node, or all (default call,import; interpreter only).",
+  "  > -O0, -O1, -O2 -- optimization level; none, constant folding and dead code removal, or those and inlining (default).",
+  "  > --time-passes -- print the time each optimizer pass took and the AST's node count before and after it.",
+  "  > --batch -- run every .jk file in a directory, or listed in a manifest file, across a pool of processes.",
+  "  > --workers=N -- processes used by --batch (default: one per CPU).",
   # "  > -c -- compile; will use compiler instead of interpreter."
   "",
   "usage:",
   "  > [jink] help                 -- shows this prompt.",
   "  > [jink] path/to/file[.jk]    -- executes interpreter on file.",
   "  > [jink] -v path/to/file[.jk] -- executes interpreter on file verbose mode.",
+  "  > [jink] --batch path/to/dir  -- executes interpreter on each file in dir, exiting with 1 if any failed.",
   # "  > [jink] -c path/to/file[.jk] -- executes compiler on file.",
   # "  > [jink] -c -v path/to/file[.jk] -- executes compiler on file in verbose mode.",
   "  > [jink]                      -- launches interpreted interactive REPL.",
@@ -33,6 +55,15 @@ if len(sys.argv) >= 1 and sys.argv[0].endswith('.py'):
 
 verbose = False
 to_compile = False
+closures = False
+use_vm = False
+resolve = False
+stream = False
+memo = False
+profile = False
+trace = None
+batch = False
+workers = None
 
 if '-v' in sys.argv:
   sys.argv.remove('-v')
@@ -40,11 +71,57 @@ if '-v' in sys.argv:
 if '-c' in sys.argv:
   sys.argv.remove('-c')
   to_compile = True
+if '--closures' in sys.argv:
+  sys.argv.remove('--closures')
+  closures = True
+if '--vm' in sys.argv:
+  sys.argv.remove('--vm')
+  use_vm = True
+if '--resolve' in sys.argv:
+  sys.argv.remove('--resolve')
+  resolve = True
+if '--stream' in sys.argv:
+  sys.argv.remove('--stream')
+  stream = True
+if '--memo' in sys.argv:
+  sys.argv.remove('--memo')
+  memo = True
+for level in range(len(optimizer.LEVELS)):
+  if f"-O{level}" in sys.argv:
+    sys.argv.remove(f"-O{level}")
+    optimizer.LEVEL = level
+if '--time-passes' in sys.argv:
+  sys.argv.remove('--time-passes')
+  optimizer.TIME_PASSES = True
+if '--profile' in sys.argv:
+  sys.argv.remove('--profile')
+  profile = True
+for arg in sys.argv:
+  if arg == '--trace' or arg.startswith('--trace='):
+    sys.argv.remove(arg)
+    names = arg.partition('=')[2] or 'call,import'
+    trace = list(EVENT_NAMES) if names == 'all' else names.split(',')
+    for name in trace:
+      if name not in EVENT_NAMES:
+        raise Exception(f"Unknown trace event '{name}', expected one of {', '.join(EVENT_NAMES)}.")
+    break
+if '--batch' in sys.argv:
+  sys.argv.remove('--batch')
+  batch = True
+for arg in sys.argv:
+  if arg.startswith('--workers='):
+    sys.argv.remove(arg)
+    workers = int(arg.partition('=')[2])
+    break
+if '--no-cache' in sys.argv:
+  sys.argv.remove('--no-cache')
+  cache.ENABLED = False
 
 # Launch REPL
 if len(sys.argv) == 0 or (len(sys.argv) == 1 and sys.argv[0] == '-v'):
   print("jink REPL - use '[jink] help' for help - type 'exit' to exit.")
-  repl = REPL(sys.stdin, sys.stdout, verbose=verbose, file_dir=Path('.'))
+  interpreter = VM() if use_vm else ClosureCompiler() if closures else Interpreter()
+  repl = REPL(sys.stdin, sys.stdout, interpreter=interpreter, verbose=verbose, file_dir=Path('.'))
   repl.main_loop()
 
 elif len(sys.argv) >= 1:
@@ -55,18 +132,65 @@ elif len(sys.argv) >= 1:
     path = Path(' '.join(sys.argv))
     path = path.resolve()
 
+    # Scripts don't share anything but the parsed modules they import
+    if batch:
+      results = run_batch(find_scripts(path), workers, 'vm' if use_vm else 'closures' if closures else 'interpreter')
+      print(format_results(results))
+      sys.exit(1 if any(result.status for result in results) else 0)
+
     if path.is_dir():
       raise Exception(f"File expected, was given dir: {path}")
 
-    code = path.open().read()
     if to_compile:
       raise NotImplementedError("Compiler not yet implemented.")
       # Compiler()._eval(code, optimize=True, verbose=verbose)
     else:
-      AST = Optimizer().optimize(Parser().parse(Lexer().parse(code), verbose=verbose), verbose=verbose)
       env = Environment()
+      if use_vm:
+        interpreter = VM()
+      elif closures:
+        interpreter = ClosureCompiler()
+      elif trace:
+        tracer = Tracer()
+        tracer.add_hook(lambda event: print(event, file=sys.stderr), *[e for name in trace for e in EVENT_NAMES[name]])
+        env = TracedEnvironment(tracer=tracer)
+        interpreter = TracingInterpreter(tracer)
+      else:
+        interpreter = Interpreter()
       env.add_builtins()
-      Interpreter().evaluate(AST, env, verbose=verbose, file_dir=path.parent)
+
+      if memo and isinstance(interpreter, Interpreter):
+        interpreter.memo = Memo()
+
+      if profile:
+        if use_vm:
+          raise Exception("Profiling is not supported by the VM.")
+        profiler = interpreter.profiler = Profiler()
+        profiler.start()
+
+      # Each statement runs as soon as it is parsed; the resolver needs the whole program up front
+      if stream and not resolve:
+        statements = Parser().parse_statements(Lexer().parse_stream(read_source(path)))
+        for expr in statements:
+          AST = Optimizer().optimize([expr], verbose=verbose)
+          interpreter.evaluate(AST, env, verbose=verbose, file_dir=path.parent)
+      else:
+        AST = cache.load_ast(path, path.read_text(), verbose=verbose, prune=True)
+        if resolve and isinstance(interpreter, Interpreter):
+          resolver = Resolver(env, file_dir=path.parent, verbose=verbose)
+          AST = resolver.resolve(AST)
+          env = resolver.frame
+        interpreter.evaluate(AST, env, verbose=verbose, file_dir=path.parent)
+
+      if profile:
+        profiler.stop()
+        print(profiler.format_report())
+        folded = Path(f"{path.stem}.folded")
+        folded.write_text(profiler.folded())
+        print(f"Folded stacks written to {folded}")
+
+      if verbose and getattr(interpreter, 'memo', None):
+        print(interpreter.memo)
 
 if __name__ == "__main__":
   pass
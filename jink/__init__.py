@@ -0,0 +1,3 @@
+__version__ = '0.0.2'
+
+from jink.program import Program, compile
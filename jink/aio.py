@@ -0,0 +1,202 @@
+import asyncio
+from inspect import isawaitable
+from jink.interpreter import Interpreter, Environment, TailCall, BREAK, CONTINUE
+from jink.program import define_globals
+from jink.utils.classes import *
+from jink.utils.evals import *
+from jink.utils.values import NULL
+
+# Programs run as coroutines, suspending wherever a function called from Jink
+# returns something awaitable, so one event loop can run many scripts that wait
+# on I/O. Functions defined in Jink are coroutines too; Python functions may or
+# may not be. Memoizing, profiling and resolved programs aren't supported.
+
+# Keep making tail calls until one returns a value, awaiting along the way
+async def trampoline(result):
+  if isawaitable(result):
+    result = await result
+  while type(result) is TailCall:
+    result = result.func(result.scope, result.args)
+    if isawaitable(result):
+      result = await result
+  return result
+
+# Builtins of a new environment, with input awaiting a line from another thread
+# and sleep pausing only the script calling it
+def add_builtins(env):
+  env.add_builtins()
+  env.index['input'] = lambda scope, args: asyncio.get_running_loop().run_in_executor(None, input, ' '.join(args))
+  env.def_func('sleep', lambda scope, args: asyncio.sleep(args[0] if args else 0))
+
+# Run a compiled Program in env, or a new environment with the async builtins
+async def run(program, env=None, globals=None):
+  if env is None:
+    env = Environment()
+    add_builtins(env)
+  define_globals(env, globals)
+  return await AsyncInterpreter().evaluate(program.ast, env, file_dir=program.file_dir)
+
+# Each run needs an AsyncInterpreter of its own, as the interpreter keeps the scope it's in
+class AsyncInterpreter(Interpreter):
+  async def evaluate(self, ast, env, verbose=False, file_dir=None):
+    self.env = env
+    self.verbose = verbose
+    self.dir = file_dir
+
+    e = []
+    for expr in ast:
+      evaled = await self.evaluate_top(expr)
+
+      # Unpack modules
+      if isinstance(evaled, list):
+        e.extend(evaled)
+      else:
+        e.append(evaled)
+    return e
+
+  # Nodes with children are evaluated here. The rest evaluate as they do in the
+  # Interpreter, calls included, as call_function gives back a coroutine to await.
+  async def evaluate_top(self, expr):
+    if isinstance(expr, UnaryOperator):
+      value = await self.evaluate_top(expr.value)
+      return unary(expr, self.unwrap_value(value))
+
+    elif isinstance(expr, BinaryOperator):
+      left, right = await self.evaluate_top(expr.left), await self.evaluate_top(expr.right)
+      return binary(expr, self.unwrap_value(left), self.unwrap_value(right))
+
+    elif isinstance(expr, Module):
+      env = self.env
+      run = lambda ast: self.evaluate(ast, env, self.verbose, self.dir)
+      return await self.modules.load_async(expr, self.dir, env, run, self.verbose)
+
+    elif isinstance(expr, Assignment):
+      value = await self.evaluate_top(expr.value)
+
+      try:
+        value = self.unwrap_value(value)
+
+      except KeyError:
+        pass
+
+      return self.env.set_var(expr.ident.name, NULL if value is None else value, expr.type)
+
+    elif isinstance(expr, Conditional):
+      body = await self.select_branch(expr)
+      if body is not None:
+        return await self.evaluate(body, self.env, self.verbose, self.dir)
+      return None
+
+    elif isinstance(expr, Loop):
+      return await self.run_loop(expr)
+
+    elif isinstance(expr, Return):
+      result = await self.evaluate_top(expr.value)
+      return { 'type': 'return', 'value': self.unwrap_value(result) }
+
+    value = super().evaluate_top(expr)
+    return await value if isawaitable(value) else value
+
+  async def select_branch(self, expr):
+    if expr.expression is None:
+      return expr.body
+
+    if truthy(self.unwrap_value(await self.evaluate_top(expr.expression))):
+      return expr.body
+
+    elif expr.else_body:
+      return expr.else_body[:1]
+
+  async def call_function(self, expr):
+    env = self.env
+    scope = env.extend(f"call_{expr.name.name}")
+    func = await self.evaluate_top(expr.name)
+    result = await trampoline(func(scope, await self.arguments(expr)))
+    self.env = env
+    return result
+
+  async def tail_call(self, expr):
+    scope = self.tail_scope(expr.name.name)
+    func = await self.evaluate_top(expr.name)
+    return TailCall(func, scope, await self.arguments(expr))
+
+  async def arguments(self, expr):
+    return [self.unwrap_value(await self.evaluate_top(arg)) for arg in expr.args]
+
+  def make_function(self, func):
+    async def function(scope, args):
+      self.bind_args(func, scope, args)
+      _return = await self.run_body(func, scope)
+
+      # Step back out of this scope
+      self.env = self.env.parent
+      return _return
+
+    self.env.def_func(func.name, function)
+    return function
+
+  def make_resolved_function(self, func):
+    raise Exception("Programs run through the Resolver can't be run asynchronously.")
+
+  async def run_body(self, func, scope):
+    return self.return_value(await self.run_block(func.body, scope))
+
+  async def run_block(self, body, scope, tail=True):
+    for e in body:
+      self.env = scope
+
+      if isinstance(e, Return):
+        if tail and isinstance(e.value, CallExpression):
+          return await self.tail_call(e.value)
+        return await self.evaluate_top(e)
+
+      elif isinstance(e, Conditional):
+        branch = await self.select_branch(e)
+        if branch:
+          result = await self.run_block(branch, scope, tail)
+          if result is not None:
+            return result
+
+      elif isinstance(e, Loop):
+        result = await self.run_loop(e)
+        if result is not None:
+          return result
+
+      elif isinstance(e, Break):
+        return BREAK
+
+      elif isinstance(e, Continue):
+        return CONTINUE
+
+      else:
+        await self.evaluate([e], scope, self.verbose, self.dir)
+
+  async def run_loop(self, expr):
+    env = self.env
+    scope = env.extend('loop')
+    body = scope.extend('loop_body')
+
+    if expr.init is not None:
+      self.env = scope
+      await self.evaluate_top(expr.init)
+
+    result = None
+    while True:
+      self.env = scope
+      if not truthy(self.unwrap_value(await self.evaluate_top(expr.condition))):
+        break
+
+      result = await self.run_block(expr.body, body, False)
+      if result is BREAK:
+        result = None
+        break
+      elif result is not None and result is not CONTINUE:
+        break
+
+      body.index.clear()
+      if expr.step is not None:
+        self.env = scope
+        await self.evaluate_top(expr.step)
+
+    self.env = env
+    return None if result is CONTINUE else result
@@ -0,0 +1,77 @@
+import io
+import time
+import contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from jink import cache, optimizer
+from jink.interpreter import Interpreter, Environment
+from jink.closures import ClosureCompiler
+from jink.vm import VM
+
+BACKENDS = {
+  'interpreter': Interpreter,
+  'closures': ClosureCompiler,
+  'vm': VM
+}
+
+# How one script went; status is 0 if it ran to the end and 1 if it raised
+class Result:
+  __slots__ = ('path', 'status', 'output', 'error', 'seconds')
+  def __init__(self, path, status, output, error, seconds):
+    self.path, self.status, self.output, self.error, self.seconds = path, status, output, error, seconds
+
+# Scripts to run from a directory, its .jk files in name order, or from a manifest
+# listing one path per line relative to the manifest
+def find_scripts(target):
+  target = Path(target).resolve()
+  if target.is_dir():
+    return sorted(target.glob('*.jk'))
+
+  paths = []
+  for line in target.read_text().splitlines():
+    if line.strip():
+      paths.append((target.parent / line.strip()).resolve())
+  return paths
+
+# Workers don't see options the CLI set on modules in the parent, so they're handed over
+def warm(level, cache_enabled):
+  optimizer.LEVEL = level
+  cache.ENABLED = cache_enabled
+
+# Run one script with its own environment, keeping what it printed.
+# Modules it imports stay parsed for the next script in the same worker.
+def run_file(path, backend='interpreter'):
+  path = Path(path)
+  output = io.StringIO()
+  status, error = 0, None
+  start = time.perf_counter()
+  try:
+    with contextlib.redirect_stdout(output):
+      env = Environment()
+      env.add_builtins()
+      ast = cache.load_ast(path, path.read_text(), prune=True)
+      BACKENDS[backend]().evaluate(ast, env, file_dir=path.parent)
+  except Exception as exception:
+    status, error = 1, str(exception)
+  return Result(path, status, output.getvalue(), error, time.perf_counter() - start)
+
+# Run scripts across a pool of processes, workers defaulting to one per CPU.
+# Results come back in the order the scripts were given.
+def run_batch(paths, workers=None, backend='interpreter'):
+  if backend not in BACKENDS:
+    raise Exception(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}.")
+
+  with ProcessPoolExecutor(workers, initializer=warm, initargs=(optimizer.LEVEL, cache.ENABLED)) as pool:
+    return list(pool.map(run_file, paths, [backend] * len(paths)))
+
+def format_results(results):
+  lines = []
+  for result in results:
+    lines.append(f"== {result.path} ({'ok' if not result.status else 'failed'}, {result.seconds * 1000:.1f} ms) ==")
+    if result.output:
+      lines.append(result.output.rstrip('\n'))
+    if result.error is not None:
+      lines.append(f"Exception: {result.error}")
+  failed = sum(result.status for result in results)
+  lines.append(f"{len(results) - failed} passed, {failed} failed in {sum(r.seconds for r in results):.3f} s of script time")
+  return '\n'.join(lines)
@@ -0,0 +1,85 @@
+import time
+from jink.interpreter import Interpreter
+
+# Nodes evaluated between checks of the clock
+CHECK_EVERY = 1000
+
+# Raised when a run uses up its budget; the run can't be resumed
+class BudgetExceeded(Exception):
+  def __init__(self, limit, message):
+    super().__init__(message)
+    self.limit = limit
+
+# Limits for one run: nodes evaluated, calls deep and seconds since the run started.
+# Any of them can be left as None.
+class Budget:
+  __slots__ = ('max_nodes', 'max_depth', 'timeout', 'clock')
+  def __init__(self, max_nodes=None, max_depth=None, timeout=None, clock=time.monotonic):
+    self.max_nodes, self.max_depth, self.timeout, self.clock = max_nodes, max_depth, timeout, clock
+
+# Like tracing, budgets are opt in by construction, so unbounded runs don't pay for
+# them. Each node costs a counter increment and compare; the clock and node limit
+# are only checked every CHECK_EVERY nodes, and call depth on calls.
+class BudgetedInterpreter(Interpreter):
+  def __init__(self, budget):
+    super().__init__()
+    self.budget = budget
+    self.running = False
+    self.nodes = 0
+    self.checkpoint = 0
+    self.deadline = None
+    self.depth = 0
+
+  # The budget starts over with each run; evaluate is also used for blocks and modules
+  def evaluate(self, ast, env, verbose=False, file_dir=None):
+    if self.running:
+      return super().evaluate(ast, env, verbose, file_dir)
+
+    budget = self.budget
+    self.running = True
+    self.nodes = self.depth = 0
+    self.deadline = None if budget.timeout is None else budget.clock() + budget.timeout
+    self.checkpoint = CHECK_EVERY if budget.max_nodes is None else min(CHECK_EVERY, budget.max_nodes + 1)
+    try:
+      return super().evaluate(ast, env, verbose, file_dir)
+
+    # Deep enough calls run out of host stack before max_depth, or with no max_depth
+    except RecursionError:
+      raise BudgetExceeded('depth', "Ran out of budget at the host's recursion limit.") from None
+    finally:
+      self.running = False
+
+  def evaluate_top(self, expr):
+    self.nodes += 1
+    if self.nodes >= self.checkpoint:
+      self.check()
+    return super().evaluate_top(expr)
+
+  def check(self):
+    budget = self.budget
+    if budget.max_nodes is not None and self.nodes > budget.max_nodes:
+      raise BudgetExceeded('nodes', f"Ran out of budget after evaluating {budget.max_nodes} nodes.")
+    if self.deadline is not None and budget.clock() >= self.deadline:
+      raise BudgetExceeded('timeout', f"Ran out of budget after {budget.timeout} seconds.")
+
+    self.checkpoint = self.nodes + CHECK_EVERY
+    if budget.max_nodes is not None:
+      self.checkpoint = min(self.checkpoint, budget.max_nodes + 1)
+
+  # Tail calls return before their callee runs, so they don't count as deeper
+  def wrap_function(self, function, func):
+    function = super().wrap_function(function, func)
+    max_depth = self.budget.max_depth
+    if max_depth is None:
+      return function
+
+    def budgeted(scope, args):
+      if self.depth >= max_depth:
+        raise BudgetExceeded('depth', f"Ran out of budget calling '{func.name}' {max_depth} calls deep.")
+      self.depth += 1
+      try:
+        return function(scope, args)
+      finally:
+        self.depth -= 1
+
+    return budgeted
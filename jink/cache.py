@@ -0,0 +1,135 @@
+import os
+import marshal
+import hashlib
+from jink import __version__
+from jink.lexer import Lexer
+from jink.parser import Parser
+from jink import optimizer
+from jink.optimizer import Optimizer
+from jink.utils.classes import *
+
+# Optimized ASTs are kept in __jinkcache__/<name>.jkc next to their source. A file is
+# the magic, the key it was written for, a digest of the payload and the marshalled
+# payload. Nodes are stored as tuples led by their index in NODES, leaving out
+# trailing fields that are still the constructor's default. The magic changes with
+# anything that changes what a cached AST means, such as the optimizer's output.
+MAGIC = b'JKC\x06'
+CACHE_DIR = '__jinkcache__'
+HEADER_SIZE = len(MAGIC) + 64
+
+# Set to False to always run the front end
+ENABLED = True
+
+# Node classes and the fields they are rebuilt from, in constructor order
+NODES = (
+  (BinaryOperator, ('operator', 'left', 'right')),
+  (UnaryOperator, ('operator', 'value')),
+  (IntegerLiteral, ('value',)),
+  (FloatingPointLiteral, ('value',)),
+  (StringLiteral, ('value',)),
+  (BooleanLiteral, ('value',)),
+  (IdentLiteral, ('name', 'index')),
+  (Null, ('value',)),
+  (Assignment, ('type', 'ident', 'value')),
+  (CallExpression, ('name', 'args')),
+  (Function, ('name', 'params', 'body', 'line')),
+  (FunctionParameter, ('name', 'type', 'default')),
+  (Return, ('value',)),
+  (Conditional, ('type', 'expression', 'body', 'else_body')),
+  (Module, ('name', 'index')),
+  (Loop, ('type', 'init', 'condition', 'step', 'body')),
+  (Break, ()),
+  (Continue, ())
+)
+TAGS = { cls: tag for tag, (cls, _) in enumerate(NODES) }
+CLASSES = tuple(cls for cls, _ in NODES)
+DEFAULTS = tuple(getattr(cls.__init__, '__defaults__', None) or () for cls in CLASSES)
+NESTED = (tuple, list, dict)
+
+# Optimized AST for a source file, read from its cache entry when that is still valid.
+# prune is passed on to the Optimizer, for programs run directly rather than imported.
+# Timing the optimizer's passes means running them, so that skips the cache too.
+def load_ast(path, code, verbose=False, prune=False):
+  if not ENABLED or verbose or optimizer.TIME_PASSES:
+    return front_end(code, verbose, prune)
+
+  key = source_key(code, prune, optimizer.LEVEL)
+  cache = cache_path(path)
+  ast = read_cache(cache, key)
+  if ast is None:
+    ast = front_end(code, verbose, prune)
+    write_cache(cache, key, ast)
+  return ast
+
+def front_end(code, verbose=False, prune=False):
+  return Optimizer(prune).optimize(Parser().parse(Lexer().tokenize(code), verbose=verbose), verbose=verbose)
+
+# Entries are only valid for the same source, optimizer options and version of jink
+def source_key(code, *options):
+  return hashlib.sha256(f"{__version__}\0{options}\0{code}".encode('utf-8', 'surrogatepass')).digest()
+
+def cache_path(path):
+  return path.parent / CACHE_DIR / f"{path.stem}.jkc"
+
+# Anything unreadable, stale or damaged counts as a miss
+def read_cache(cache, key):
+  try:
+    data = cache.read_bytes()
+  except OSError:
+    return None
+
+  if data[:len(MAGIC)] != MAGIC or data[len(MAGIC):len(MAGIC) + 32] != key:
+    return None
+  payload = data[HEADER_SIZE:]
+  if hashlib.sha256(payload).digest() != data[len(MAGIC) + 32:HEADER_SIZE]:
+    return None
+
+  try:
+    return [decode(node) for node in marshal.loads(payload)]
+  except Exception:
+    return None
+
+# Caching is best effort, a directory that can't be written to just means no cache
+def write_cache(cache, key, ast):
+  try:
+    payload = marshal.dumps([encode(node) for node in ast])
+  except ValueError:
+    return
+
+  temp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+  try:
+    cache.parent.mkdir(exist_ok=True)
+    temp.write_bytes(MAGIC + key + hashlib.sha256(payload).digest() + payload)
+    os.replace(temp, cache)
+  except OSError:
+    pass
+
+def encode(value):
+  if isinstance(value, list):
+    return [encode(v) for v in value]
+  elif isinstance(value, dict):
+    return { k: encode(v) for k, v in value.items() }
+  elif type(value) in TAGS:
+    tag = TAGS[type(value)]
+    fields = [getattr(value, field) for field in NODES[tag][1]]
+
+    # Shared defaults, like an identifier's index, stay shared when decoded
+    defaults = DEFAULTS[tag]
+    while defaults and fields[-1] is defaults[-1]:
+      fields.pop()
+      defaults = defaults[:-1]
+    return (tag,) + tuple(encode(f) for f in fields)
+  elif value is None or isinstance(value, (bool, int, float, str)):
+    return value
+  raise ValueError(f"Can not cache value of type {type(value).__name__}.")
+
+# Runs once per node when loading, so primitives are passed through without a call
+def decode(value):
+  t = type(value)
+  if t is tuple:
+    return CLASSES[value[0]](*[decode(v) if type(v) in NESTED else v for v in value[1:]])
+  elif t is list:
+    return [decode(v) if type(v) in NESTED else v for v in value]
+  elif t is dict:
+    return { k: decode(v) if type(v) in NESTED else v for k, v in value.items() }
+  return value
@@ -0,0 +1,278 @@
+from jink.modules import ModuleRegistry
+from jink.utils.classes import *
+from jink.utils.evals import *
+from jink.utils.values import NULL, Cell, literal_value
+
+# Marks the value of a return statement on its way out of a block
+class ReturnValue:
+  __slots__ = ('value')
+  def __init__(self, value):
+    self.value = value
+
+# Break and continue leave blocks the same way, so blocks have nothing more to check
+BREAK, CONTINUE = ReturnValue(None), ReturnValue(None)
+
+# Compiles the optimized AST into a tree of closures, one per node.
+# Every node is dispatched once at compile time; operators, literals
+# and call argument lists are bound into the closures so running the
+# program is nothing but nested Python calls taking the current scope.
+class ClosureCompiler:
+  def __init__(self):
+    self.dir = None
+    self.verbose = False
+    self.modules = ModuleRegistry()
+    self.profiler = None
+    self.handlers = {
+      IdentLiteral: self.compile_ident,
+      StringLiteral: self.compile_literal,
+      IntegerLiteral: self.compile_literal,
+      FloatingPointLiteral: self.compile_literal,
+      BooleanLiteral: self.compile_boolean,
+      Null: self.compile_null,
+      UnaryOperator: self.compile_unary,
+      BinaryOperator: self.compile_binary,
+      Module: self.compile_module,
+      Assignment: self.compile_assignment,
+      Conditional: self.compile_conditional,
+      Loop: self.compile_loop,
+      Break: lambda expr: lambda env: BREAK,
+      Continue: lambda expr: lambda env: CONTINUE,
+      CallExpression: self.compile_call,
+      Function: self.compile_function,
+      Return: self.compile_return,
+      dict: self.compile_object
+    }
+
+  # Same entry point as Interpreter.evaluate so either can drive the CLI and REPL
+  def evaluate(self, ast, env, verbose=False, file_dir=None):
+    self.verbose = verbose
+    self.dir = file_dir
+    return self.run(self.compile(ast), env)
+
+  def compile(self, ast):
+    return [self.compile_node(expr) for expr in ast]
+
+  def run(self, program, env):
+    e = []
+    for node in program:
+      evaled = node(env)
+
+      # Unpack modules
+      if isinstance(evaled, list):
+        e.extend(evaled)
+      elif isinstance(evaled, ReturnValue):
+        e.append({ 'type': 'return', 'value': evaled.value })
+      else:
+        e.append(evaled)
+    return e
+
+  def compile_node(self, expr):
+    handler = self.handlers.get(type(expr))
+    if handler is None:
+      return lambda env: None
+    return handler(expr)
+
+  # Run statements in order, stopping at the first return
+  def compile_block(self, body):
+    nodes = tuple(self.compile_node(e) for e in body)
+
+    if len(nodes) == 1:
+      return nodes[0]
+
+    def block(env):
+      result = None
+      for node in nodes:
+        result = node(env)
+        if type(result) is ReturnValue:
+          return result
+      return result
+    return block
+
+  def compile_ident(self, expr):
+    name = expr.name
+    lookup = compile_lookup(name)
+
+    if None in (expr.index['type'], expr.index['index']):
+      def ident(env):
+        var = lookup(env)
+        return var.value if type(var) is Cell else var
+      return ident
+
+    elif expr.index['type'] == 'prop':
+      index = expr.index['index']
+
+      if isinstance(index, IdentLiteral):
+        prop = index.name
+        def get_prop(env):
+          var = lookup(env)
+          if var.type != 'obj':
+            raise Exception(f"Variable '{name}' of type {var.type} does not support indexing")
+          obj = var.value
+          if prop not in obj:
+            raise Exception(f"Object '{name}' does not contain the property '{prop}'")
+          return obj[prop]
+        return get_prop
+
+      # TODO: Object methods, classes.
+
+      elif isinstance(index, CallExpression):
+        return self.compile_call(index)
+
+    return lambda env: None
+
+  def compile_literal(self, expr):
+    value = expr.value
+    return lambda env: value
+
+  def compile_boolean(self, expr):
+    value = expr.value == 'true'
+    return lambda env: value
+
+  def compile_null(self, expr):
+    return lambda env: NULL
+
+  def compile_object(self, expr):
+    return lambda env: expr
+
+  # TODO Properly evaluate unary operators modifying variables
+  # (e.g. pre and post increment ++i and i++)
+  def compile_unary(self, expr):
+    value = self.compile_node(expr.value)
+
+    def operation(env):
+      v = value(env)
+      seen, fast = expr.cache
+      if type(v) is seen:
+        return fast(v)
+      return unary(expr, v)
+    return operation
+
+  def compile_binary(self, expr):
+    left, right = self.compile_node(expr.left), self.compile_node(expr.right)
+
+    def operation(env):
+      l, r = left(env), right(env)
+      seen, fast = expr.cache
+      if type(l) is seen and type(r) is seen:
+        return fast(l, r)
+      return binary(expr, l, r)
+    return operation
+
+  def compile_module(self, expr):
+    def module(env):
+      run = lambda ast: self.run(self.compile(ast), env)
+      return self.modules.load(expr, self.dir, env, run, self.verbose)
+    return module
+
+  def compile_assignment(self, expr):
+    name, var_type = expr.ident.name, expr.type
+    value = self.compile_node(expr.value)
+
+    def assignment(env):
+      v = value(env)
+      return env.set_var(name, NULL if v is None else v, var_type)
+    return assignment
+
+  def compile_conditional(self, expr):
+    body = self.compile_block(expr.body)
+
+    # Else
+    if expr.expression is None:
+      return body
+
+    test = self.compile_node(expr.expression)
+    else_body = self.compile_node(expr.else_body[0]) if expr.else_body else None
+
+    def conditional(env):
+      if truthy(test(env)):
+        return body(env)
+      elif else_body is not None:
+        return else_body(env)
+    return conditional
+
+  # The body's scope is made once per run of the loop and emptied after each pass
+  def compile_loop(self, expr):
+    init = self.compile_node(expr.init) if expr.init is not None else None
+    test = self.compile_node(expr.condition)
+    step = self.compile_node(expr.step) if expr.step is not None else None
+    body = self.compile_block(expr.body)
+
+    def loop(env):
+      scope = env.extend('loop')
+      if init is not None:
+        init(scope)
+      inner = scope.extend('loop_body')
+      index = inner.index
+
+      while truthy(test(scope)):
+        result = body(inner)
+        if type(result) is ReturnValue:
+          if result is BREAK:
+            break
+          elif result is not CONTINUE:
+            return result
+        index.clear()
+        if step is not None:
+          step(scope)
+    return loop
+
+  def compile_call(self, expr):
+    name = expr.name.name
+    s_type = f"call_{name}"
+    lookup = compile_lookup(name)
+    args = tuple(self.compile_node(arg) for arg in expr.args)
+
+    def call(env):
+      func = lookup(env)
+      return func(env.extend(s_type), [arg(env) for arg in args])
+    return call
+
+  def compile_function(self, func):
+    name = func.name
+
+    # Parameter defaults are literals, so they are read once at compile time
+    params = tuple((p.name, p.type, literal_value(p.default)) for p in func.params)
+    body = self.compile_block(func.body)
+
+    def function(scope, args):
+
+      # Exception upon overload
+      if len(args) > len(params):
+        raise Exception(f"Function '{name}' takes {len(params)} arguments but {len(args)} were given.")
+
+      # Apply arguments to this call's scope
+      # If argument doesn't exist use function default if it exists
+      for i, (p_name, p_type, default) in enumerate(params):
+        value = args[i] if i < len(args) else None
+        if value is None or value is NULL:
+          value = default
+        scope.set_var(p_name, value, p_type, fn_scoped=True)
+
+      result = body(scope)
+      if type(result) is not ReturnValue or result.value is None:
+        return NULL
+      return result.value
+
+    if self.profiler is not None:
+      function = self.profiler.wrap(function, name, func.line)
+
+    def define(env):
+      env.def_func(name, function)
+      return function
+    return define
+
+  def compile_return(self, expr):
+    value = self.compile_node(expr.value)
+    return lambda env: ReturnValue(value(env))
+
+# Walk the scope chain for a name without the extra lookups of Environment.get_var
+def compile_lookup(name):
+  def lookup(env):
+    scope = env
+    while scope is not None:
+      index = scope.index
+      if name in index:
+        return index[name]
+      scope = scope.parent
+    raise Exception(f"{name} is not defined.")
+  return lookup
@@ -0,0 +1,160 @@
+from bisect import bisect_left, bisect_right
+from jink.lexer import Lexer
+from jink.parser import Parser
+from jink.utils import classes
+from jink.utils.classes import Function
+from jink.utils.token_stream import NEWLINE
+
+# Functions can be anywhere in an expression, so every node is walked
+def move_functions(node, lines):
+  if isinstance(node, list):
+    for n in node:
+      move_functions(n, lines)
+    return
+  elif type(node).__module__ != classes.__name__:
+    return
+  elif isinstance(node, Function):
+    node.line += lines
+
+  fields = getattr(node, '__slots__', None)
+  if fields is None:
+    values = vars(node).values()
+  else:
+    values = [getattr(node, field) for field in ((fields,) if isinstance(fields, str) else fields)]
+  for value in values:
+    move_functions(value, lines)
+
+# A top level statement, from its first token up to the next statement's, and the line
+# the lexer is on where it starts. The first segment starts at the top of the source
+# and has no nodes if there are no statements.
+# nodes is None for source that fails to parse, which always runs to the end.
+class Segment:
+  __slots__ = ('line', 'nodes')
+  def __init__(self, line, nodes):
+    self.line, self.nodes = line, nodes
+
+# Source kept parsed across edits. An edit re-lexes and re-parses the statements it
+# touches and the one before it, taking in more of the following statements while
+# that fails to parse. Everything else keeps its nodes, moved to their new offsets
+# and lines, so the cost of an edit depends on the statements it touches.
+class Document:
+  def __init__(self, text=''):
+    self.text = text
+    self.starts = [0]
+    self.segments = [Segment(1, [])]
+    self.error = None
+
+    # Length of the source re-lexed by the last edit
+    self.relexed = 0
+    self.reparse(0, 0)
+
+  # Top level statements, as Parser.parse would give them for the whole text
+  @property
+  def ast(self):
+    if self.error is not None:
+      raise self.error
+    return [node for segment in self.segments for node in segment.nodes]
+
+  # Replace deleted characters at offset with inserted, returning the new AST or raising
+  # the parse error if it doesn't parse. The document is updated either way.
+  def edit(self, offset, deleted, inserted):
+    if not 0 <= offset <= offset + deleted <= len(self.text):
+      raise Exception(f"Edit of {deleted} characters at {offset} is outside of the source.")
+
+    self.text = self.text[:offset] + inserted + self.text[offset + deleted:]
+    first = max(self.segment_at(offset) - 1, 0)
+    last = self.segment_at(offset + deleted)
+    delta = len(inserted) - deleted
+    for i in range(last + 1, len(self.starts)):
+      self.starts[i] += delta
+
+    self.reparse(first, last)
+    return self.ast
+
+  def segment_at(self, offset):
+    return max(bisect_right(self.starts, offset) - 1, 0)
+
+  # Parse the source of segments first to last again, with more of the segments after
+  # them while it doesn't parse or its last statement runs on into the next one
+  def reparse(self, first, last):
+    count = len(self.segments)
+    line = self.segments[first].line if first else 1
+    while True:
+      start = self.starts[first]
+      end = self.starts[last + 1] if last + 1 < count else len(self.text)
+      try:
+        region = self.parse_region(start, end, line)
+      except Exception as exception:
+        if last + 1 == count:
+          self.replace(first, last, [start], [Segment(line, None)])
+          self.error = exception
+          return
+        region = None
+
+      if region is None:
+        last = min(last + (last - first + 1), count - 1)
+        continue
+      starts, segments, end_line = region
+      break
+
+    # Text before the first statement stays with the statement before it,
+    # or starts the first segment
+    if first == 0:
+      if not segments:
+        segments = [Segment(1, [])]
+      starts = [0] + starts[1:]
+      segments[0].line = 1
+
+    # Source that failed to parse runs to the end, so it's gone if the last segment was parsed
+    if last + 1 == count:
+      self.error = None
+    else:
+      self.move_lines(last + 1, end_line - self.segments[last + 1].line)
+    self.replace(first, last, starts, segments)
+
+  # Statements past an edit keep their nodes, only their lines change. Lines are
+  # counted the way the lexer counts them, which skips line breaks inside strings.
+  def move_lines(self, first, lines):
+    if not lines:
+      return
+    for segment in self.segments[first:]:
+      segment.line += lines
+      move_functions(segment.nodes, lines)
+
+  def replace(self, first, last, starts, segments):
+    self.starts[first:last + 1] = starts
+    self.segments[first:last + 1] = segments
+
+  # Lex and parse text[start:end] as it would be lexed as part of the whole source,
+  # returning where each statement starts, its segment and the line end is on. The
+  # line after end is lexed too, to catch a statement, string or comment going on
+  # past end (an unclosed call, an if picking up an else); None is returned for those.
+  def parse_region(self, start, end, line):
+    stop = self.text.find('\n', end) + 1 or len(self.text)
+    lexer = Lexer()
+    lexer.line = lexer.first_line = line
+    lexer.pos = start
+    lexer.line_pos = start - (self.text.rfind('\n', 0, start) + 1)
+    tokens = lexer.tokenize(self.text[start:stop])
+    self.relexed = stop - start
+
+    parser = Parser()
+    statements = parser.parse_statements(tokens)
+    boundary = bisect_left(tokens.starts, end - start)
+    if end < len(self.text) and (boundary == len(tokens) or tokens.starts[boundary] != end - start):
+      return None
+    starts, segments = [], []
+    index = 0
+    while True:
+      while index < boundary and tokens.types[index] == NEWLINE:
+        index += 1
+      if index == boundary:
+        break
+      node = next(statements)
+      starts.append(start + tokens.starts[index])
+      segments.append(Segment(tokens.start_line(index), [node]))
+      index = parser.tokens.index
+      if index > boundary:
+        return None
+
+    return starts, segments, tokens.start_line(boundary) if boundary < len(tokens) else lexer.line
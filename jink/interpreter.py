@@ -1,41 +1,30 @@
-from jink.lexer import Lexer
-from jink.parser import Parser
-from jink.optimizer import Optimizer
+from jink.modules import ModuleRegistry
+from jink.memo import makes_tail_calls
 from jink.utils.classes import *
 from jink.utils.evals import *
-
-TYPES = {
-  int: 'int',
-  float: 'float',
-  str: 'string',
-  dict: 'obj'
-}
+from jink.utils.values import NULL, Cell, to_string, literal_value
 
 # The interpreter environment
 class Environment:
-  def __init__(self, parent=None, s_type=None, debug=False):
+  def __init__(self, parent=None, s_type=None):
     self._id = parent._id + 1 if parent else 0
     self.index = {}
     self.parent = parent
     self.type = s_type
-    self.debug = debug
 
   # To define builtin methods - only for use on the top level interpreter environment
   def add_builtins(self):
-    self.def_func('print', lambda scope, args: print('\n'.join([str(x) for x in args]) or 'null'))
-    self.def_func('string', lambda scope, args: [str(x or 'null') for x in args][0] if len(args) == 1 else [str(x or 'null') for x in args])
+    self.def_func('print', lambda scope, args: print('\n'.join([to_string(x) for x in args])) or NULL)
+    self.def_func('string', lambda scope, args: to_string(args[0]) if len(args) == 1 else [to_string(x) for x in args])
     self.def_func('input', lambda scope, args: input(' '.join(args)))
 
+  # Scopes are of the same class as their parent, so tracing carries into calls
   def extend(self, s_type):
-    return Environment(self, s_type)
+    return type(self)(self, s_type)
 
   def find_scope(self, name):
-    if self.debug:
-      print(f"Searching for {name} in scopes..")
     scope = self
     while scope:
-      if self.debug:
-        print(f"Searching {scope._id}.. found {list(self.index.keys())}")
       if name in scope.index:
         return scope
       scope = scope.parent
@@ -53,33 +42,30 @@ class Environment:
   # Functions override to update values
   # from parent scopes in local scope during their lifecycle
   def set_var(self, name, value, var_type=None, fn_scoped=False):
-    scope = self.find_scope(name)
-
-    for py_type, _type in TYPES.items():
-      if isinstance(value, py_type):
-        val_type = _type
-
     if fn_scoped:
-      self.index[name] = { 'value': value, 'type': val_type, 'var_type': var_type }
+      self.index[name] = Cell(value, var_type)
       return value
 
+    scope = self.find_scope(name)
+
     # Assignments
     if scope:
-      v = scope.get_var(name)
+      var = scope.index[name]
 
       if var_type != None:
         raise Exception(f"{name} is already defined.")
-      elif v['var_type'] == 'const':
+      elif type(var) is not Cell:
+        raise Exception(f"Function {name} is not reassignable.")
+      elif var.var_type == 'const':
         raise Exception(f"Constant {name} is not reassignable.")
 
-      scope.index[name]['value'] = value
-      scope.index[name]['type'] = val_type
+      var.set(value)
 
     # Definitions
     else:
       if not var_type:
         raise Exception(f"Expected let or const, got 'null' for {name}.")
-      self.index[name] = { 'value': value, 'type': val_type, 'var_type': var_type }
+      self.index[name] = Cell(value, var_type)
 
     return value
 
@@ -88,23 +74,70 @@ class Environment:
     if scope:
       raise Exception(f"Function '{name}' is already defined!")
 
-    if self.debug:
-      print(f"Defining {name} in {self._id}")
-    
     self.index[name] = func
     return func
 
   def __str__(self):
     return f"{self.parent or 'null'}->{self._id}:{list(self.index.keys())}"
 
+# Array-backed scope for programs run through the Resolver;
+# variables are addressed by (depth, slot) instead of by name
+class Frame:
+  __slots__ = ('slots', 'parent')
+  def __init__(self, size, parent=None):
+    self.slots = [NULL] * size
+    self.parent = parent
+
+  def get(self, depth, slot):
+    frame = self
+    while depth:
+      frame = frame.parent
+      depth -= 1
+    return frame.slots[slot]
+
+  # Definitions create a new variable, assignments update the existing one
+  def set(self, depth, slot, value, var_type=None):
+    frame = self
+    while depth:
+      frame = frame.parent
+      depth -= 1
+
+    if var_type:
+      frame.slots[slot] = Cell(value, var_type)
+    else:
+      frame.slots[slot].set(value)
+    return value
+
+# A call in tail position. The function making it returns this instead of calling,
+# and whoever called that function makes the call once its Python frame is gone.
+class TailCall:
+  __slots__ = ('func', 'scope', 'args')
+  def __init__(self, func, scope, args):
+    self.func, self.scope, self.args = func, scope, args
+
+# What a block inside a loop hands back to it when it runs into break or continue
+BREAK, CONTINUE = object(), object()
+
+# Keep making tail calls until one returns a value
+def trampoline(result):
+  while type(result) is TailCall:
+    result = result.func(result.scope, result.args)
+  return result
+
 class Interpreter:
   def __init__(self):
     self.ast = []
+    self.modules = ModuleRegistry()
+    self.memo = None
+    self.profiler = None
 
   def evaluate(self, ast, env, verbose=False, file_dir=None):
     self.env = env
     self.verbose = verbose
     self.dir = file_dir
+    if self.memo is not None:
+      self.memo.analyze(ast)
+
     e = []
     for expr in ast:
       evaled = self.evaluate_top(expr)
@@ -126,10 +159,10 @@ class Interpreter:
       elif expr.index['type'] == 'prop':
         var = self.env.get_var(expr.name)
 
-        if var['type'] != 'obj':
-          raise Exception(f"Variable '{expr.name}' of type {var['type']} does not support indexing")
+        if var.type != 'obj':
+          raise Exception(f"Variable '{expr.name}' of type {var.type} does not support indexing")
 
-        obj = var['value']
+        obj = var.value
         if isinstance(expr.index['index'], IdentLiteral):
           if expr.index['index'].name not in obj:
             raise Exception(f"Object '{expr.name}' does not contain the property '{expr.index['index'].name}'")
@@ -142,62 +175,59 @@ class Interpreter:
         elif isinstance(expr.index['index'], CallExpression):
           return self.call_function(expr.index['index'])
 
+    elif isinstance(expr, ResolvedIdent):
+      var = self.env.get(expr.depth, expr.slot)
+      if expr.index is None:
+        return var
+
+      if var.type != 'obj':
+        raise Exception(f"Variable '{expr.name}' of type {var.type} does not support indexing")
+
+      obj = var.value
+      if isinstance(expr.index['index'], IdentLiteral):
+        if expr.index['index'].name not in obj:
+          raise Exception(f"Object '{expr.name}' does not contain the property '{expr.index['index'].name}'")
+        return obj[expr.index['index'].name]
+
+      elif isinstance(expr.index['index'], CallExpression):
+        return self.call_function(expr.index['index'])
+
     elif isinstance(expr, (StringLiteral, IntegerLiteral, FloatingPointLiteral)):
       return self.unwrap_value(expr)
 
     elif isinstance(expr, BooleanLiteral):
-      return True if self.unwrap_value(expr) == 'true' else False
+      return expr.value == 'true'
 
     elif isinstance(expr, Null):
-      return { 'type': 'null', 'value': 'null' }
+      return NULL
 
     # TODO Properly evaluate unary operators modifying variables
     # (e.g. pre and post increment ++i and i++)
     elif isinstance(expr, UnaryOperator):
-      # print(expr.value)
       value = self.evaluate_top(expr.value)
-      return UNOP_EVALS[expr.operator](self.unwrap_value(value)) or 0
-
+      if type(value) is Cell:
+        value = value.value
+      seen, fast = expr.cache
+      if type(value) is seen:
+        return fast(value)
+      return unary(expr, self.unwrap_value(value))
+
+    # Variables are unwrapped here, so operands the inline cache expects skip unwrap_value
     elif isinstance(expr, BinaryOperator):
       left, right = self.evaluate_top(expr.left), self.evaluate_top(expr.right)
-      return BINOP_EVALS[expr.operator](self.unwrap_value(left), self.unwrap_value(right)) or 0
+      if type(left) is Cell:
+        left = left.value
+      if type(right) is Cell:
+        right = right.value
+      seen, fast = expr.cache
+      if type(left) is seen and type(right) is seen:
+        return fast(left, right)
+      return binary(expr, self.unwrap_value(left), self.unwrap_value(right))
 
     elif isinstance(expr, Module):
-
-      # Get nested Modules
-      index = []
-      while expr:
-        index.insert(0, expr.name)
-        expr = expr.index
-
-      # Relative import
-      relative = False
-      if index[0] == '.':
-        index.pop()
-        relative = True
-
-      # Pretend like I know what I'm doing
-      # TODO Standard Library
-
-      try:
-        if relative:
-          module = (self.dir / f"{index[0]}.jk").open().read()
-        else:
-          # Is Directory
-          if (self.dir / index[0]).is_dir():
-            pass
-          # Is File
-          elif (self.dir / f"{index[0]}.jk").is_file():
-            module = (self.dir / f"{index[0]}.jk").open().read()
-          else:
-            raise Exception(f"Module '{index[0]}' not found at '{self.dir}'.")
-      except:
-        raise Exception(f"Failed to import module {index[0]}.")
-
-      lexed = Lexer().parse(module)
-      parsed = Parser().parse(lexed, self.verbose)
-      optimized = Optimizer().optimize(parsed, self.verbose)
-      return self.evaluate(optimized, self.env, self.verbose, self.dir)
+      env = self.env
+      run = lambda ast: self.evaluate(ast, env, self.verbose, self.dir)
+      return self.modules.load(expr, self.dir, env, run, self.verbose)
 
     elif isinstance(expr, Assignment):
       value = self.evaluate_top(expr.value)
@@ -207,24 +237,18 @@ class Interpreter:
 
       except KeyError:
         pass
-      return self.env.set_var(expr.ident.name, value if value != None else 'null', expr.type)
-
-    elif isinstance(expr, Conditional):
-      if hasattr(expr, 'expression') and expr.expression != None:
-        result = self.evaluate_condition(self.evaluate_top(expr.expression))
-
-        if result not in ('true', 'false'):
-          raise Exception("Conditional improperly used.")
 
-        elif result == 'true':
-          return self.evaluate(expr.body, self.env)
+      if isinstance(expr.ident, ResolvedIdent):
+        return self.env.set(expr.ident.depth, expr.ident.slot, NULL if value is None else value, expr.type)
+      return self.env.set_var(expr.ident.name, NULL if value is None else value, expr.type)
 
-        elif result == 'false' and expr.else_body:
-          return self.evaluate_top(expr.else_body[0])
+    elif isinstance(expr, Conditional):
+      body = self.select_branch(expr)
+      if body is not None:
+        return self.evaluate(body, self.env, self.verbose, self.dir)
 
-        else:
-          return
-      self.evaluate(expr.body, self.env)
+    elif isinstance(expr, Loop):
+      return self.run_loop(expr)
 
     elif isinstance(expr, CallExpression):
       return self.call_function(expr)
@@ -232,6 +256,9 @@ class Interpreter:
     elif isinstance(expr, Function):
       return self.make_function(expr)
 
+    elif isinstance(expr, ResolvedFunction):
+      return self.make_resolved_function(expr)
+
     elif isinstance(expr, Return):
       result = self.evaluate_top(expr.value)
       return { 'type': 'return', 'value': self.unwrap_value(result) }
@@ -239,28 +266,96 @@ class Interpreter:
     elif isinstance(expr, dict):
       return expr
 
-  def evaluate_condition(self, cond):
-    if cond in ('true', 'false'):
-      return cond
+  # The statements a conditional runs, the else branch being a conditional of its own
+  def select_branch(self, expr):
+    if expr.expression is None:
+      return expr.body
 
-    elif cond in (True, False):
-      return 'true' if True else 'false'
+    if truthy(self.unwrap_value(self.evaluate_top(expr.expression))):
+      return expr.body
 
-    elif 'type' in cond:
-      if cond['type'] == 'null':
-        return 'false'
-
-      elif cond['type'] != 'bool':
-        return 'true'
+    elif expr.else_body:
+      return expr.else_body[:1]
 
   # Call a function in a new scope
   def call_function(self, expr):
-    scope = self.env.extend(f"call_{expr.name.name}")
+
+    # Resolved functions make their own frame
+    if isinstance(expr.name, ResolvedIdent):
+      func = self.env.get(expr.name.depth, expr.name.slot)
+      return trampoline(func(None, [self.unwrap_value(self.evaluate_top(arg)) for arg in expr.args]))
+
+    # Functions step back to their scope's parent, which for tail calls is the function
+    # that made them, so the caller's scope is put back once the trampoline is done
+    env = self.env
+    scope = env.extend(f"call_{expr.name.name}")
+    func = self.evaluate_top(expr.name)
+    result = trampoline(func(scope, [self.unwrap_value(self.evaluate_top(arg)) for arg in expr.args]))
+    self.env = env
+    return result
+
+  # Like call_function, but leaves the call to the trampoline. The callee's scope extends
+  # the current function's like any call's, only the Python frame isn't kept.
+  def tail_call(self, expr):
+    if isinstance(expr.name, ResolvedIdent):
+      func = self.env.get(expr.name.depth, expr.name.slot)
+      return TailCall(func, None, [self.unwrap_value(self.evaluate_top(arg)) for arg in expr.args])
+
+    scope = self.tail_scope(expr.name.name)
     func = self.evaluate_top(expr.name)
-    return func(scope, [self.unwrap_value(self.evaluate_top(arg)) for arg in expr.args])
+    return TailCall(func, scope, [self.unwrap_value(self.evaluate_top(arg)) for arg in expr.args])
+
+  # A function that was tail called has nothing left to run in the scope of the one that
+  # called it, so that scope's variables are folded into its own before it tail calls in
+  # turn. Lookups find the same variables, but chains of tail calls don't lengthen the
+  # scope chain.
+  def tail_scope(self, name):
+    env = self.env
+    if env.type is not None and env.type.startswith('tail_'):
+      done = env.parent
+      for key, var in done.index.items():
+        env.index.setdefault(key, var)
+      env.parent = done.parent
+    return env.extend(f"tail_{name}")
 
   # Make a function
   def make_function(self, func):
+    def function(scope, args):
+      self.bind_args(func, scope, args)
+      _return = self.run_body(func, scope)
+
+      # Step back out of this scope
+      self.env = self.env.parent
+      return _return
+
+    function = self.wrap_function(function, func)
+    self.env.def_func(func.name, function)
+    return function
+
+  # Apply arguments to a call's scope
+  def bind_args(self, func, scope, args):
+    params = func.params
+
+    # Exception upon overload
+    if len(args) > len(params):
+      raise Exception(f"Function '{func.name}' takes {len(params)} arguments but {len(args)} were given.")
+
+    i = 0
+    for p in params:
+      value = self.param_value(p, args, i)
+
+      if value != None:
+        try:
+          scope.set_var(p.name, value, p.type, fn_scoped=True)
+        except Exception as e:
+          raise Exception(f"{e}\nException: Improper function parameter or call argument at function '{func.name}'.")
+      i += 1
+
+  # Make a function whose variables were addressed by the Resolver.
+  # Each call gets a fixed-size frame whose parent is the frame the function was defined in.
+  def make_resolved_function(self, func):
+    closure = self.env
+
     def function(scope, args):
       params = func.params
 
@@ -268,59 +363,123 @@ class Interpreter:
       if len(args) > len(params):
         raise Exception(f"Function '{func.name}' takes {len(params)} arguments but {len(args)} were given.")
 
-      # Apply arguments to this call's scope
-      # If argument doesn't exist use function default if it exists
+      # Parameters take the first slots of the frame
+      frame = Frame(func.size, closure)
       i = 0
 
       for p in params:
-        default = None
+        value = self.param_value(p, args, i)
+        frame.slots[i] = Cell(value, p.type)
+        i += 1
 
-        if p.default:
-          default = self.unwrap_value(p.default)
+      caller = self.env
+      _return = self.run_body(func, frame)
+      self.env = caller
+      return _return
 
-        if len(args) > i:
-          value = args[i] if args[i] not in (None, 'null') else default or 'null'
+    function = self.wrap_function(function, func)
+    self.env.slots[func.slot] = function
+    return function
 
-        else:
-          value = default if default not in (None, 'null') else 'null'
+  # Memoize or profile a function about to be defined
+  def wrap_function(self, function, func):
 
-        if value != None:
-          try:
-            scope.set_var(p.name, value, p.type, fn_scoped=True)
-          except Exception as e:
-            raise Exception(f"{e}\nException: Improper function parameter or call argument at function '{func.name}'.")
-        i += 1
+    # Cached results have to be final values, so functions making tail calls aren't memoized
+    if self.memo is not None and self.memo.is_pure(func) and not makes_tail_calls(func.body):
+      function = self.memo.wrap(function)
+    if self.profiler is not None:
+      function = self.profiler.wrap(function, func.name, func.line)
+    return function
 
-      # Ensure returning of the correct value
-      _return = None
-      for e in func.body:
-        result = self.evaluate([e], scope)[0]
+  # If argument doesn't exist use function default if it exists
+  def param_value(self, p, args, i):
+    if len(args) > i and args[i] is not None and args[i] is not NULL:
+      return args[i]
+    return literal_value(p.default)
 
-        if isinstance(result, list):
-          result = result[0] if len(result) > 0 else []
+  # Evaluate a function body in its scope and ensure returning of the correct value
+  def run_body(self, func, scope):
+    return self.return_value(self.run_block(func.body, scope))
 
-        if result and isinstance(result, dict) and result['type'] == 'return':
-          if isinstance(result['value'], bool):
-            _return = 'true' if result['value'] == True else 'false'
+  def return_value(self, result):
+    if type(result) is TailCall:
+      return result
 
-          elif isinstance(result['value'], (int, float)):
-            _return = result['value'] if result['value'] != None else 0
+    _return = result['value'] if result else None
+    if _return is None or (isinstance(_return, list) and (_return[0] in (None, NULL) or _return[0]['value'] is None)):
+      return NULL
 
-          else:
-            _return = result['value']
-          break
+    return _return
 
-      # Step back out of this scope
-      self.env = self.env.parent
+  # Run statements until one of them returns, breaks or continues, looking into the branches
+  # conditionals take. Returning a call hands back a TailCall rather than making the call
+  # here, unless the block is in a loop.
+  def run_block(self, body, scope, tail=True):
+    for e in body:
+      self.env = scope
 
-      if _return is None or (isinstance(_return, list) and (_return[0] in (None, 'null') or _return[0]['value'] is None)):
-        return 'null'
+      if isinstance(e, Return):
+        if tail and isinstance(e.value, CallExpression):
+          return self.tail_call(e.value)
+        return self.evaluate_top(e)
+
+      elif isinstance(e, Conditional):
+        branch = self.select_branch(e)
+        if branch:
+          result = self.run_block(branch, scope, tail)
+          if result is not None:
+            return result
+
+      elif isinstance(e, Loop):
+        result = self.run_loop(e)
+        if result is not None:
+          return result
+
+      elif isinstance(e, Break):
+        return BREAK
+
+      elif isinstance(e, Continue):
+        return CONTINUE
 
       else:
-        return _return
+        self.evaluate([e], scope, self.verbose, self.dir)
+
+  # A loop gets one scope for its header and one for its body, which is emptied after
+  # each pass rather than made anew. Resolved programs already gave loops their own
+  # slots in the frame. Returns what a return statement in the body gave back, if any.
+  def run_loop(self, expr):
+    env = self.env
+    if isinstance(env, Frame):
+      scope = body = env
+    else:
+      scope = env.extend('loop')
+      body = scope.extend('loop_body')
+
+    if expr.init is not None:
+      self.env = scope
+      self.evaluate_top(expr.init)
+
+    result = None
+    while True:
+      self.env = scope
+      if not truthy(self.unwrap_value(self.evaluate_top(expr.condition))):
+        break
+
+      result = self.run_block(expr.body, body, False)
+      if result is BREAK:
+        result = None
+        break
+      elif result is not None and result is not CONTINUE:
+        break
+
+      if body is not scope:
+        body.index.clear()
+      if expr.step is not None:
+        self.env = scope
+        self.evaluate_top(expr.step)
 
-    self.env.def_func(func.name, function)
-    return function
+    self.env = env
+    return None if result is CONTINUE else result
 
   # Obtain literal values
   def unwrap_value(self, v):
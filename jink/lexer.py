@@ -1,6 +1,7 @@
+import re
 from jink.utils.names import *
 from jink.utils.classes import Token, TokenType
-from jink.utils.future_iter import FutureIter
+from jink.utils.token_stream import TokenStream
 
 KEYWORDS = KEYWORDS + TYPES
 
@@ -14,191 +15,307 @@ OPERATORS = (
   '++', '--'
 )
 
+KEYWORD_SET = frozenset(KEYWORDS)
+OPERATOR_SET = frozenset(OPERATORS)
+
+# Runs the lexer consumes in one step instead of character by character.
+# \s and \w match exactly what str.isspace and str.isalnum (plus '_') accept.
+SPACE_RUN = re.compile(r'[^\S\n]*')
+IDENT_RUN = re.compile(r'\w*')
+NUMBER_RUN = re.compile(r'[\d.]*')
+OPERATOR_RUN = re.compile(r'[.|=!?:+\-*/%^&~#><]*')
+COMMENT_END = re.compile(r'[\r\n]')
+NEWLINES = re.compile(r'[\r\n]')
+STRING_STOPS = { "'": re.compile(r"['\\]"), '"': re.compile(r'["\\]') }
+
+# What a token starting with a given character turns out to be
+SPACE, NEWLINE, ESCAPE, SLASH, PUNCTUATION, QUOTE, IDENT, DIGIT, DOT, OPERATOR, INVALID = range(11)
+
+PUNCTUATION_TYPES = {
+  '(': TokenType.LPAREN, ')': TokenType.RPAREN,
+  '[': TokenType.LBRACKET, ']': TokenType.RBRACKET,
+  '{': TokenType.LBRACE, '}': TokenType.RBRACE,
+  ';': TokenType.SEMICOLON, ',': TokenType.COMMA
+}
+
+def classify(char):
+  if char == '\\':
+    return ESCAPE
+  elif char == '\n':
+    return NEWLINE
+  elif char.isspace():
+    return SPACE
+  elif char == '/':
+    return SLASH
+  elif char in PUNCTUATION_TYPES:
+    return PUNCTUATION
+  elif char in ("'", '"'):
+    return QUOTE
+  elif char.isalpha() or char in ('_', '$'):
+    return IDENT
+  elif char.isdigit():
+    return DIGIT
+  elif char == '.':
+    return DOT
+  elif char in OPERATOR_SET:
+    return OPERATOR
+  return INVALID
+
+# Dispatch table for the first character of a token, filled in for anything outside ASCII on first sight
+CHAR_KINDS = { chr(c): classify(chr(c)) for c in range(128) }
+
 # One lexer boi
 class Lexer:
   def __init__(self):
     self.pos = 0
     self.line = 1
     self.line_pos = 0
+    self.first_line = 1
+    self.chunks = iter(())
 
   def parse(self, code):
-    self.code = FutureIter(code)
-    self.code_end = len(str(self.code)) - 1
+    self.code = code
+    self.code_end = len(code) - 1
     return [token for token in self.parse_tokens()]
 
-  def parse_literal(self, code):
-    return str([token.smallStr() for token in self.parse(code)])
+  # Lex into parallel arrays pointing back into the source instead of Token objects
+  def tokenize(self, code):
+    self.code = code
+    self.code_end = len(code) - 1
+    stream = TokenStream(code)
+    add_type, add_start, add_end = stream.types.append, stream.starts.append, stream.ends.append
+    add_line, add_pos = stream.lines.append, stream.positions.append
+    codes = TokenStream.CODES
+    for _type, value, start, end, line, pos in self.scan():
+      add_type(codes[_type])
+      add_start(start)
+      add_end(end)
+      add_line(line)
+      add_pos(pos)
+    return stream
 
   def parse_tokens(self):
-    while self.code.current is not None:
-
-      # All good, increment positions
-      self.line_pos += 1
-      self.pos += 1
-
-      char = self.code._next()
+    code = self.code
+    for _type, value, start, end, line, pos in self.scan():
+      yield Token(_type, code[start:end] if value is None else value, line, pos)
+
+  # Lex source handed over in pieces, holding only the current piece in memory.
+  # Pieces should end on a line break; strings and comments running past the end
+  # of a piece pull in the pieces after it.
+  def parse_stream(self, chunks):
+    self.chunks = iter(chunks)
+    for chunk in self.chunks:
+      self.code = chunk
+      self.first_line = self.line
+      for _type, value, start, end, line, pos in self.scan():
+        yield Token(_type, self.code[start:end] if value is None else value, line, pos)
+
+  # Append the next streamed piece to the buffer, if there is one
+  def read_more(self):
+    chunk = next(self.chunks, None)
+    if chunk is None:
+      return False
+    self.code += chunk
+    return True
 
-      if char == '\\':
-        if self.code.current == '\n':
-          self.line += 1
-          self.line_pos = 0
-        self.code._next()
-        char = self.code.current
-        continue
+  def parse_literal(self, code):
+    return str([token.smallStr() for token in self.parse(code)])
 
-      if char.isspace():
-        if char == '\n':
-          self.line_pos = 0
-          self.line += 1
-          yield Token(TokenType.NEWLINE, 'newline', self.line, self.pos)
+  # Source line and caret for error messages
+  def context(self, line_pos):
+    return str(self.code).split('\n')[self.line - self.first_line], f"{' ' * (line_pos - 1)}^"
+
+  # Works on the whole buffer, yielding (type, value, start, end, line, pos) where value
+  # is only given when it is not simply the source slice. The common tokens are handled
+  # inline on local copies of the positions; self.i, self.line, self.line_pos and
+  # self.pos are synced whenever one of the parse_* helpers takes over.
+  def scan(self):
+    code = self.code
+    n = len(code)
+    i, line, line_pos, pos = 0, self.line, self.line_pos, self.pos
+    kinds = CHAR_KINDS
+    space_run, ident_run, operator_run = SPACE_RUN.match, IDENT_RUN.match, OPERATOR_RUN.match
+
+    while i < n:
+      char = code[i]
+      i += 1
 
-      # Comments
-      elif char == '/':
-        if self.code.current in ('/', '*'):
-          self.process_comment()
+      # All good, increment positions
+      line_pos += 1
+      pos += 1
+
+      kind = kinds.get(char)
+      if kind is None:
+        kind = kinds[char] = classify(char)
+
+      if kind == SPACE:
+        # Every whitespace character counts as a step of its own
+        end = space_run(code, i).end()
+        line_pos += end - i
+        pos += end - i
+        i = end
+
+      elif kind == NEWLINE:
+        line_pos = 0
+        line += 1
+        yield TokenType.NEWLINE, 'newline', i - 1, i, line, pos
+
+      # Variables are fun, especially when you name them ridiculous things.
+      elif kind == IDENT:
+        end = ident_run(code, i).end()
+        line_pos += end - i
+        start, i = i - 1, end
+        if code[start:end] in KEYWORD_SET:
+          yield TokenType.KEYWORD, None, start, end, line, pos
         else:
-          yield self.parse_operator(char)
-
-      # Brackets
-      elif char == '(':
-        yield Token(TokenType.LPAREN, '(', self.line, self.pos)
-      elif char == ')':
-        yield Token(TokenType.RPAREN, ')', self.line, self.pos)
-      elif char == '[':
-        yield Token(TokenType.LBRACKET, '[', self.line, self.pos)
-      elif char == ']':
-        yield Token(TokenType.RBRACKET, ']', self.line, self.pos)
-      elif char == '{':
-        yield Token(TokenType.LBRACE, '{', self.line, self.pos)
-      elif char == '}':
-        yield Token(TokenType.RBRACE, '}', self.line, self.pos)
-
-      elif char == ';':
-        yield Token(TokenType.SEMICOLON, ';', self.line, self.pos)
-
-      elif char == ',':
-        yield Token(TokenType.COMMA, ',', self.line, self.pos)
-
-      elif char in ("'", '"'):
-        yield self.parse_string(char)
-
-      elif char.isalpha() or char in ('_', '$'):
-        yield self.parse_ident(char)
-
-      elif char.isdigit() or (char == '.' and self.code.current.isdigit()):
-        yield self.parse_number(char)
-
-      elif char in OPERATORS:
-        yield self.parse_operator(char)
-
-      else:
+          yield TokenType.IDENTIFIER, None, start, end, line, pos
+
+      elif kind == PUNCTUATION:
+        yield PUNCTUATION_TYPES[char], None, i - 1, i, line, pos
+
+      # 2 + 2 = 4 - 1 = 3
+      elif kind == OPERATOR or (kind == SLASH and (i >= n or code[i] not in ('/', '*'))) \
+        or (kind == DOT and (i >= n or not code[i].isdigit())):
+        end = operator_run(code, i).end()
+        if code[i - 1:end] not in OPERATOR_SET:
+          self.line, self.line_pos = line, line_pos
+          raise Exception('Invalid operator on {0}:{1}\n  {2}\n  {3}'.format(
+            line, line_pos, *self.context(line_pos)
+          ))
+        line_pos += end - i
+        start, i = i - 1, end
+        yield TokenType.OPERATOR, None, start, end, line, pos
+
+      elif kind == ESCAPE:
+        if i < n:
+          if code[i] == '\n':
+            line += 1
+            line_pos = 0
+          i += 1
+
+      elif kind == INVALID:
+        self.line, self.line_pos = line, line_pos
         raise Exception('Invalid character on {0}:{1}\n  {2}\n  {3}'.format(
-          self.line, self.line_pos, str(self.code).split('\n')[self.line - 1], f"{' ' * (self.line_pos - 1)}^"
+          line, line_pos, *self.context(line_pos)
         ))
 
-  # Variables are fun, especially when you name them ridiculous things.
-  def parse_ident(self, char):
-    ident = char
-    while self.code.current is not None and (self.code.current.isalnum() or self.code.current == '_'):
-      ident += self.code.current
-      self.code._next()
-      self.line_pos += 1
-    if ident in KEYWORDS:
-      return Token(TokenType.KEYWORD, ident, self.line, self.pos)
-    return Token(TokenType.IDENTIFIER, ident, self.line, self.pos)
+      # Numbers, strings and comments
+      else:
+        self.i, self.line, self.line_pos, self.pos = i, line, line_pos, pos
+        start = i - 1
+        if kind == QUOTE:
+          column, value = self.parse_string(char)
+          yield TokenType.STRING, value, start, self.i, self.line, column
+        elif kind == SLASH:
+          self.process_comment()
+        else:
+          self.parse_number(char)
+          yield TokenType.NUMBER, None, start, self.i, line, pos
+        i, line, line_pos = self.i, self.line, self.line_pos
+        code, n = self.code, len(self.code)
 
-  # 2 + 2 = 4 - 1 = 3
-  def parse_operator(self, operator):
-    line_start = self.line_pos
-    start = self.pos
-    while self.code.current is not None and self.code.current in OPERATORS:
-      operator += self.code.current
-      self.line_pos += 1
-      self.code._next()
-    if not operator in OPERATORS:
-      raise Exception('Invalid operator on {0}:{1}\n  {2}\n  {3}'.format(
-        self.line, line_start, str(self.code).split('\n')[self.line - 1], f"{' ' * (line_start - 1)}^"
-      ))
-    return Token(TokenType.OPERATOR, operator, self.line, start)
+    self.i, self.line, self.line_pos, self.pos = i, line, line_pos, pos
 
   # Yay, I can "Hello world" now!
   def parse_string(self, char):
-    string = ''
+    code = self.code
+    n = len(code)
+    stops = STRING_STOPS[char]
+    parts = []
     end = False
     start = self.line_pos
-    while self.code.current is not None:
+
+    # Streamed source may end mid-string, in which case the next piece is pulled in
+    while self.i < n or self.read_more():
+      code, n = self.code, len(self.code)
+      stop = stops.search(code, self.i)
+      if stop is None and self.read_more():
+        continue
+
+      elif stop is None:
+        self.line_pos += n - self.i
+        parts.append(code[self.i:])
+        self.i = n
+        break
+
+      at = stop.start()
+      parts.append(code[self.i:at])
+      self.line_pos += at - self.i
 
       # Ending the string? So soon? Aw. :(
-      if self.code.current == char:
+      if code[at] == char:
         end = True
-        self.code._next()
+        self.i = at + 1
         self.line_pos += 1
         break
 
       # Handle escaped characters
-      if self.code.current == '\\':
-        self.code._next()
-        self.line_pos += 1
-
-        # Get escaped character
-        nxt = self.code._next()
-
-        # Newline is a special case
-        if nxt == 'n':
-          string += "\n"
-          self.line += 1
-          self.line_pos = 0
-
-        # Add escaped character and move on
-        else:
-          string += nxt
-          self.line_pos += 1
-
-      else:
-        string += self.code._next()
+      self.line_pos += 1
+      nxt = code[at + 1] if at + 1 < n else None
+      self.i = at + 2
+
+      # Newline is a special case
+      if nxt == 'n':
+        parts.append("\n")
+        self.line += 1
+        self.line_pos = 0
+
+      # Add escaped character and move on
+      elif nxt is not None:
+        parts.append(nxt)
         self.line_pos += 1
 
-    if self.code.current == None and end == False:
+    if not end:
       raise Exception('A string was not properly enclosed at {0}:{1}\n  {2}\n  {3}'.format(
-        self.line, start, str(self.code).split('\n')[self.line - 1], f"{' ' * (start - 1)}^"
+        self.line, start, *self.context(start)
       ))
 
-    return Token(TokenType.STRING, string, self.line, start)
+    return start, ''.join(parts)
 
   # Crunch those numbers.
   def parse_number(self, char):
-    num = char
+    code = self.code
     line_start = self.line_pos
-    while self.code.current is not None and not self.code.current.isspace() and (self.code.current.isdigit() or self.code.current == '.'):
-      num += self.code.current
-      self.code._next()
-      self.line_pos += 1
+    start = self.i - 1
+    self.i = NUMBER_RUN.match(code, self.i).end()
+
+    # Digits outside of \d, like superscripts, still count for str.isdigit
+    while self.i < len(code) and code[self.i].isdigit():
+      self.i = NUMBER_RUN.match(code, self.i + 1).end()
+
+    self.line_pos += self.i - start - 1
 
     # The heck?
-    if num.count('.') > 1:
+    if code.count('.', start, self.i) > 1:
       raise Exception('Invalid number at {0}:{1}\n  {2}\n  {3}'.format(
-        self.line, line_start, str(self.code).split('\n')[self.line - 1], f"{' ' * (line_start - 1)}^"
+        self.line, line_start, *self.context(line_start)
       ))
-    else:
-      return Token(TokenType.NUMBER, num, self.line, self.pos)
 
   # Do I really need to comment on comments?
   def process_comment(self):
-    cur = self.code.current
+    code = self.code
+
     # Single-line comment
-    if self.code.current == '/':
-      while not self.code.current in ('\r', '\n', None):
-        self.line_pos += 1
-        self.code._next()
-    # Multi-line comment
-    elif self.code._next() == '*':
-      while self.code.current is not None and (f"{cur}{self.code.current}" != '*/'):
-        self.line_pos += 1
-        if self.code.current in ('\r', '\n'):
-          self.line_pos = 0
-          self.line += 1
-        cur = self.code._next()
+    if code[self.i] == '/':
+      stop = COMMENT_END.search(code, self.i)
+      end = stop.start() if stop else len(code)
+      self.line_pos += end - self.i
+      self.i = end
 
-      if self.code.current is None or self.code.current is not '/':
+    # Multi-line comment; the opening '*' can also close it, as in /*/
+    else:
+      close = code.find('*/', self.i)
+      while close == -1 and self.read_more():
+        code = self.code
+        close = code.find('*/', self.i)
+      if close == -1:
         raise Exception('A multi-line comment was not closed.')
-      self.code._next()
+
+      body = code[self.i + 1:close + 1]
+      newlines = [m.end() for m in NEWLINES.finditer(body)]
+      if newlines:
+        self.line += len(newlines)
+        self.line_pos = len(body) - newlines[-1]
+      else:
+        self.line_pos += len(body)
+      self.i = close + 2
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from jink.utils.classes import *
+
+# Builtins that only depend on their arguments
+PURE_BUILTINS = ('string',)
+
+# Results kept per function before the least recently used ones are dropped
+MEMO_SIZE = 1024
+
+# Flags functions whose result only depends on their arguments: they read nothing but
+# their parameters and locals declared before the read, assign nothing outside
+# themselves, define no functions, import nothing and only call pure functions. Calls are matched by name, so a name
+# is only pure if every function defined with it is.
+def find_pure(ast):
+  functions = []
+  collect_functions(ast, functions)
+
+  calls = {}
+  for func in functions:
+    calls[func] = function_calls(func)
+
+  pure = { func for func in functions if calls[func] is not None }
+  changed = True
+  while changed:
+    changed = False
+    names = pure_names(functions, pure)
+    for func in list(pure):
+      if not calls[func] <= names | { func.name }:
+        pure.discard(func)
+        changed = True
+  return pure
+
+def pure_names(functions, pure):
+  names = set(PURE_BUILTINS)
+  for func in functions:
+    names.add(func.name)
+  for func in functions:
+    if func not in pure:
+      names.discard(func.name)
+  return names
+
+def collect_functions(body, functions):
+  for expr in body:
+    if isinstance(expr, Function):
+      functions.append(expr)
+      collect_functions(expr.body, functions)
+    elif isinstance(expr, Conditional):
+      collect_functions(expr.body, functions)
+      collect_functions(expr.else_body or [], functions)
+    elif isinstance(expr, Loop):
+      collect_functions(expr.body, functions)
+
+# Names of the functions a function calls, or None if it does anything impure itself
+def function_calls(func):
+  calls = set()
+  if not pure_block(func.body, { p.name for p in func.params }, calls):
+    return None
+  return calls
+
+# A name declared in a block is local from its declaration to the end of the block.
+# Before that, or past a branch that may have declared it, it can be a global.
+def pure_block(body, local, calls):
+  local = set(local)
+  return all(pure_expr(expr, local, calls) for expr in body)
+
+def pure_expr(expr, local, calls):
+  if expr is None or isinstance(expr, (IntegerLiteral, FloatingPointLiteral, StringLiteral, BooleanLiteral, Null)):
+    return True
+
+  elif isinstance(expr, dict):
+    return True
+
+  elif isinstance(expr, IdentLiteral):
+    return expr.name in local and not isinstance(expr.index['index'], CallExpression)
+
+  elif isinstance(expr, UnaryOperator):
+    return pure_expr(expr.value, local, calls)
+
+  elif isinstance(expr, BinaryOperator):
+    return pure_expr(expr.left, local, calls) and pure_expr(expr.right, local, calls)
+
+  elif isinstance(expr, Assignment):
+    if not pure_expr(expr.value, local, calls):
+      return False
+    if expr.type:
+      local.add(expr.ident.name)
+      return True
+    return expr.ident.name in local
+
+  elif isinstance(expr, Conditional):
+    return pure_expr(expr.expression, local, calls) \
+      and pure_block(expr.body, local, calls) \
+      and pure_block(expr.else_body or [], local, calls)
+
+  # The init declares into the loop's scope, which the body's scope is inside of
+  elif isinstance(expr, Loop):
+    local = set(local)
+    return pure_expr(expr.init, local, calls) and pure_expr(expr.condition, local, calls) \
+      and pure_block(expr.body, local, calls) and pure_expr(expr.step, local, calls)
+
+  elif isinstance(expr, (Break, Continue)):
+    return True
+
+  elif isinstance(expr, CallExpression):
+    if expr.name.name in local:
+      return False
+    calls.add(expr.name.name)
+    return all(pure_expr(arg, local, calls) for arg in expr.args)
+
+  elif isinstance(expr, Return):
+    return pure_expr(expr.value, local, calls)
+
+  # Modules, nested functions and anything unknown
+  return False
+
+# Whether a function body returns the result of a call, which the interpreter runs as a tail call.
+# Returns inside loops aren't.
+def makes_tail_calls(body):
+  for expr in body:
+    if isinstance(expr, Return) and isinstance(expr.value, CallExpression):
+      return True
+    elif isinstance(expr, Conditional):
+      if makes_tail_calls(expr.body) or makes_tail_calls(expr.else_body or []):
+        return True
+  return False
+
+# Caches the results of pure functions, keyed by their arguments
+class Memo:
+  def __init__(self, size=MEMO_SIZE):
+    self.size = size
+    self.pure = {}
+    self.hits = 0
+    self.misses = 0
+
+  # Flag the functions of a program or module that haven't been looked at yet
+  def analyze(self, ast):
+    functions = []
+    collect_functions(ast, functions)
+    if any(func not in self.pure for func in functions):
+      pure = find_pure(ast)
+      for func in functions:
+        self.pure.setdefault(func, func in pure)
+
+  def is_pure(self, func):
+    return self.pure.get(func, False)
+
+  def wrap(self, function):
+    results = OrderedDict()
+
+    def memoized(scope, args):
+      # Types are part of the key so 1, 1.0 and true stay apart
+      key = tuple(args) + tuple(type(arg) for arg in args)
+      try:
+        result = results[key]
+      except KeyError:
+        pass
+      except TypeError:
+        return function(scope, args)
+      else:
+        results.move_to_end(key)
+        self.hits += 1
+        return result
+
+      self.misses += 1
+      result = results[key] = function(scope, args)
+      if len(results) > self.size:
+        results.popitem(last=False)
+      return result
+
+    return memoized
+
+  def hit_rate(self):
+    calls = self.hits + self.misses
+    return self.hits / calls if calls else 0.0
+
+  def __str__(self):
+    return f"memo: {self.hits} hits, {self.misses} misses ({self.hit_rate():.1%} hit rate)"
@@ -0,0 +1,110 @@
+from jink.cache import load_ast
+
+# Optimized module ASTs shared by every interpreter in the process.
+# Keyed by resolved path, an entry is only used while the file's mtime and size match.
+AST_CACHE = {}
+
+# Find the file an import points to
+def find_module(expr, file_dir):
+
+  # Get nested Modules
+  index = []
+  while expr:
+    index.insert(0, expr.name)
+    expr = expr.index
+
+  # Relative import
+  relative = False
+  if index[0] == '.':
+    index.pop()
+    relative = True
+
+  # Pretend like I know what I'm doing
+  # TODO Standard Library
+
+  try:
+    if relative:
+      path = file_dir / f"{index[0]}.jk"
+    else:
+      # Is Directory
+      if (file_dir / index[0]).is_dir():
+        raise Exception(f"Module '{index[0]}' is a directory.")
+      # Is File
+      elif (file_dir / f"{index[0]}.jk").is_file():
+        path = file_dir / f"{index[0]}.jk"
+      else:
+        raise Exception(f"Module '{index[0]}' not found at '{file_dir}'.")
+    return path.resolve(), stamp(path)
+  except:
+    raise Exception(f"Failed to import module {index[0]}.")
+
+def stamp(path):
+  stat = path.stat()
+  return stat.st_mtime_ns, stat.st_size
+
+# Lex, parse and optimize a module, or reuse the AST from last time if the file is unchanged
+def parse_module(path, key, verbose=False):
+  cached = AST_CACHE.get(path)
+  if cached and cached[0] == key:
+    return cached[1]
+
+  optimized = load_ast(path, path.read_text(), verbose)
+  AST_CACHE[path] = (key, optimized)
+  return optimized
+
+# Modules imported by one interpreter. A module is evaluated on its first import;
+# later imports of the unchanged file hand out what it defined the first time.
+class ModuleRegistry:
+  def __init__(self):
+    self.exports = {}
+    self.loading = set()
+
+  # Evaluate the module with run(ast), which defines its names in env
+  def load(self, expr, file_dir, env, run, verbose=False):
+    path, key = find_module(expr, file_dir)
+    results = self.reuse(path, key, env)
+    if results is not None:
+      return results
+
+    defined = set(env.index)
+    self.loading.add(path)
+    try:
+      results = run(parse_module(path, key, verbose))
+    finally:
+      self.loading.discard(path)
+    return self.save(path, key, env, defined, results)
+
+  # Same as load, for a run(ast) that has to be awaited
+  async def load_async(self, expr, file_dir, env, run, verbose=False):
+    path, key = find_module(expr, file_dir)
+    results = self.reuse(path, key, env)
+    if results is not None:
+      return results
+
+    defined = set(env.index)
+    self.loading.add(path)
+    try:
+      results = await run(parse_module(path, key, verbose))
+    finally:
+      self.loading.discard(path)
+    return self.save(path, key, env, defined, results)
+
+  # What the module gave last time, or None if it has to be evaluated
+  def reuse(self, path, key, env):
+
+    # Import cycle, the module is already being evaluated
+    if path in self.loading:
+      return []
+
+    cached = self.exports.get(path)
+    if cached and cached[0] == key:
+      _, exports, results = cached
+      for name, value in exports.items():
+        if name not in env.index:
+          env.index[name] = value
+      return results
+
+  def save(self, path, key, env, defined, results):
+    exports = { name: value for name, value in env.index.items() if name not in defined }
+    self.exports[path] = (key, exports, results)
+    return results
@@ -1,62 +1,420 @@
+import time
 from jink.utils.classes import *
 from jink.utils.evals import *
+from jink.utils.values import literal_value
+
+LITERALS = (IntegerLiteral, FloatingPointLiteral, StringLiteral, BooleanLiteral)
+
+# Largest return expression, in nodes, a function can have to be inlined
+INLINE_SIZE = 16
+
+# How many inlined calls deep calls inside inlined bodies are still inlined
+INLINE_DEPTH = 4
+
+# Passes run at each optimization level, in order
+LEVELS = (
+  (),
+  ('fold', 'prune'),
+  ('fold', 'inline', 'prune')
+)
+
+# Used by optimizers created without a level or timing option, set by the CLI's -O flags
+LEVEL = 2
+TIME_PASSES = False
 
 class Optimizer:
+  # Removing functions nothing calls is only safe when the AST is a whole program;
+  # modules and REPL lines define functions for code the optimizer never sees.
+  # bindings are constants and inlinable functions defined before the AST runs, such as
+  # by earlier REPL inputs. Those the AST adds to them are left in self.defined.
+  def __init__(self, prune=False, level=None, time_passes=None, bindings=None):
+    self.prune = prune
+    self.bindings = {} if bindings is None else bindings
+    self.defined = self.bindings
+    self.level = LEVEL if level is None else level
+    self.time_passes = TIME_PASSES if time_passes is None else time_passes
+    self.inlining = False
+    self.depth = 0
+    self.passes = {
+      'fold': self.fold,
+      'inline': self.inline_calls,
+      'prune': self.prune_unused
+    }
+
+    if not 0 <= self.level < len(LEVELS):
+      raise Exception(f"Unknown optimization level {self.level}.")
+
+    # (pass, seconds, nodes before, nodes after) for every pass run while timing
+    self.report = []
+
   def optimize(self, ast, verbose=False):
     self.verbose = verbose
-    optimized = []
     if ast is None:
       raise Exception("AST not found")
-    for expr in ast:
-      folded = self.const_fold(expr)
+
+    for name in LEVELS[self.level]:
+      if not self.time_passes:
+        ast = self.passes[name](ast)
+        continue
+
+      before = count_nodes(ast)
+      start = time.perf_counter()
+      ast = self.passes[name](ast)
+      self.report.append((name, time.perf_counter() - start, before, count_nodes(ast)))
+
+    if self.time_passes:
+      print(format_report(self.report))
+    return ast
+
+  # Fold constants, propagate them and drop code that can't run
+  def fold(self, ast):
+    self.defined = dict(self.bindings)
+    return self.fold_block(ast, self.defined, False)
+
+  # Fold again, replacing calls to small functions with their bodies
+  def inline_calls(self, ast):
+    self.inlining = True
+    self.defined = dict(self.bindings)
+    try:
+      return self.fold_block(ast, self.defined, False)
+    finally:
+      self.inlining = False
+
+  def prune_unused(self, ast):
+    return prune_functions(ast) if self.prune else ast
+
+  # Fold a block of statements. bindings maps constants bound so far to their literals
+  # and functions that can be inlined to their definitions, and gets the block's own
+  # definitions added; branches are given a copy so theirs don't leak out.
+  # Inside functions nothing after a return is kept.
+  def fold_block(self, body, bindings, in_function):
+    optimized = []
+    for expr in body:
+      folded = self.const_fold(expr, bindings, in_function)
+
+      # Conditionals with a known outcome are replaced by the branch they take
       if isinstance(folded, list):
-        for f in folded:
-          optimized.append(f)
+        optimized.extend(folded)
       else:
         optimized.append(folded)
+
+      if isinstance(expr, Assignment):
+        bindings.pop(expr.ident.name, None)
+        if expr.type == 'const' and isinstance(folded.value, LITERALS):
+          bindings[expr.ident.name] = folded.value
+
+      elif isinstance(expr, Function):
+        bindings.pop(expr.name, None)
+        if inlinable(folded, bindings):
+          bindings[expr.name] = folded
+
+      if in_function and optimized and isinstance(optimized[-1], Return):
+        break
     return optimized
 
-  def const_fold(self, expr):
-    if isinstance(expr, UnaryOperator):
-      left = self.const_fold(expr.value)
+  def const_fold(self, expr, bindings=None, in_function=False):
+    if bindings is None:
+      bindings = {}
+
+    if isinstance(expr, IdentLiteral):
+      if expr.index['type'] is None and isinstance(bindings.get(expr.name), LITERALS):
+        return bindings[expr.name]
 
-      if isinstance(left, IntegerLiteral):
-        return IntegerLiteral(int(UNOP_EVALS[expr.operator](left.value)))
+    elif isinstance(expr, UnaryOperator):
+      value = self.const_fold(expr.value, bindings)
 
-      elif isinstance(left, FloatingPointLiteral):
-        return FloatingPointLiteral(UNOP_EVALS[expr.operator](left.value))
+      if isinstance(value, LITERALS):
+        try:
+          return literal(UNOP_EVALS[expr.operator](literal_value(value)))
+        except (TypeError, ValueError, ArithmeticError):
+          pass
+      return UnaryOperator(expr.operator, value)
 
     elif isinstance(expr, BinaryOperator):
-      left, right = self.const_fold(expr.left), self.const_fold(expr.right)
+      left, right = self.const_fold(expr.left, bindings), self.const_fold(expr.right, bindings)
 
-      # Evaluate result of binop
-      evaled = BINOP_EVALS[expr.operator](left.value, right.value)
+      if isinstance(left, StringLiteral) and isinstance(right, StringLiteral) and expr.operator != '+':
+        raise Exception(f"Only '+' operator can be used for string/string binop.")
+      elif isinstance(left, StringLiteral) and isinstance(right, IntegerLiteral) and expr.operator != '*':
+        raise Exception(f"Only '*' operator can be used for string/int binop.")
 
-      # Return corresponding value
-      if isinstance(evaled, int):
-        return IntegerLiteral(evaled)
-      elif isinstance(evaled, float):
-        return FloatingPointLiteral(evaled)
+      # Evaluate result of binop the same way the interpreter would
+      if isinstance(left, LITERALS) and isinstance(right, LITERALS):
+        try:
+          return literal(BINOP_EVALS[expr.operator](literal_value(left), literal_value(right)))
+        except (TypeError, ValueError, ArithmeticError):
+          pass
+      return BinaryOperator(expr.operator, left, right)
 
-      # String concatenation
-      elif isinstance(left, StringLiteral) and isinstance(right, StringLiteral):
-        if expr.operator != '+':
-          raise Exception(f"Only '+' operator can be used for string/string binop.")
-        return StringLiteral(str(left.value) + str(right.value))
+    elif isinstance(expr, Assignment):
+      expr.value = self.const_fold(expr.value, bindings)
 
-      # String multiplication
-      elif isinstance(left, StringLiteral) and isinstance(right, IntegerLiteral):
-        if expr.operator != '*':
-          raise Exception(f"Only '*' operator can be used for string/int binop.")
-        return StringLiteral(str(left.value)*right.value)
+    elif isinstance(expr, Conditional):
+      return self.fold_conditional(expr, bindings, in_function)
 
-    elif isinstance(expr, Assignment):
-      expr.value = self.const_fold(expr.value)
+    elif isinstance(expr, Loop):
+      return self.fold_loop(expr, bindings, in_function)
 
+    # Scopes are dynamic, so a caller's parameter or local can hide an outer constant
+    # while the body runs. Only functions to inline are carried into it.
     elif isinstance(expr, Function):
-      expr.body = self.const_fold(expr.body)
+      params = [p.name for p in expr.params]
+      scope = { k: v for k, v in bindings.items() if isinstance(v, Function) and k not in params }
+      expr.body = self.fold_block(expr.body, scope, True)
 
     elif isinstance(expr, CallExpression):
-      expr.args = [self.const_fold(e) for e in expr.args]
+      expr.args = [self.const_fold(e, bindings) for e in expr.args]
+      func = bindings.get(expr.name.name)
+      if self.inlining and isinstance(func, Function) and self.depth < INLINE_DEPTH:
+        inlined = self.inline(func, expr.args, bindings)
+        if inlined is not None:
+          return inlined
+
+    elif isinstance(expr, Return):
+      expr.value = self.const_fold(expr.value, bindings)
 
     return expr
+
+  # The function's return expression with the arguments in place of its parameters,
+  # folded again, or None when that wouldn't behave like the call. Arguments are put
+  # where the parameters are used instead of being evaluated first, so they can't
+  # call anything and are only copied if they are as cheap as reading a variable.
+  def inline(self, func, args, bindings):
+    params = [p.name for p in func.params]
+    if len(args) != len(params) or not closed(func.body[0].value, params, bindings, func.name):
+      return None
+
+    uses = {}
+    count_uses(func.body[0].value, uses)
+    for name, arg in zip(params, args):
+      if isinstance(arg, Null) or not call_free(arg):
+        return None
+      if uses.get(name, 0) > 1 and not isinstance(arg, LITERALS + (IdentLiteral,)):
+        return None
+
+    self.depth += 1
+    try:
+      return self.const_fold(substitute(func.body[0].value, dict(zip(params, args))), bindings)
+    finally:
+      self.depth -= 1
+
+  # Returns the statements to run in place of the conditional when its outcome is known
+  def fold_conditional(self, expr, bindings, in_function):
+    body = self.fold_block(expr.body, dict(bindings), in_function)
+
+    # Else
+    if expr.expression is None:
+      return body
+
+    condition = self.const_fold(expr.expression, bindings)
+    else_body = []
+    if expr.else_body:
+      folded = self.fold_conditional(expr.else_body[0], bindings, in_function)
+      if isinstance(folded, list):
+        else_body = [Conditional('else', None, folded, None)] if folded else []
+      else:
+        else_body = [folded]
+
+    truth = known_truth(condition)
+    if truth is True:
+      return body
+    elif truth is False:
+      return else_body[0].body if else_body and else_body[0].expression is None else else_body
+    return Conditional(expr.type, condition, body, else_body)
+
+  # Loops are given a copy of the bindings like branches, their header's included.
+  # Those whose condition always fails are dropped, unless their init defines something.
+  def fold_loop(self, expr, bindings, in_function):
+    scope = dict(bindings)
+    init = self.fold_block([expr.init], scope, False)[0] if expr.init is not None else None
+    condition = self.const_fold(expr.condition, scope)
+    if init is None and known_truth(condition) is False:
+      return []
+
+    body = self.fold_block(expr.body, dict(scope), in_function)
+    step = self.const_fold(expr.step, scope) if expr.step is not None else None
+    return Loop(expr.type, init, condition, step, body)
+
+def literal(value):
+  if isinstance(value, bool):
+    return BooleanLiteral('true' if value else 'false')
+  elif isinstance(value, int):
+    return IntegerLiteral(value)
+  elif isinstance(value, float):
+    return FloatingPointLiteral(value)
+  elif isinstance(value, str):
+    return StringLiteral(value)
+  raise TypeError(f"Can not fold value of type {type(value).__name__}.")
+
+# Whether a condition always passes or always fails, or None if that depends on the run
+def known_truth(expr):
+  if isinstance(expr, LITERALS + (Null,)):
+    return truthy(literal_value(expr))
+
+# Functions that only return a small expression of their parameters and calls to other
+# inlinable functions. With scopes being dynamic, reading anything else could see the
+# caller's variables once inlined. Defaults are left alone, null arguments pick them.
+def inlinable(func, bindings):
+  if len(func.body) != 1 or not isinstance(func.body[0], Return) or func.body[0].value is None:
+    return False
+  if any(p.default is not None for p in func.params):
+    return False
+  params = [p.name for p in func.params]
+  return size(func.body[0].value) <= INLINE_SIZE and closed(func.body[0].value, params, bindings, func.name)
+
+# Whether an expression only reads params and calls inlinable functions other than itself.
+# Checked again at each call site, a parameter there can hide a function's name.
+def closed(expr, params, bindings, name):
+  if isinstance(expr, LITERALS):
+    return True
+
+  elif isinstance(expr, IdentLiteral):
+    return expr.name in params and expr.index['type'] is None
+
+  elif isinstance(expr, UnaryOperator):
+    return closed(expr.value, params, bindings, name)
+
+  elif isinstance(expr, BinaryOperator):
+    return closed(expr.left, params, bindings, name) and closed(expr.right, params, bindings, name)
+
+  elif isinstance(expr, CallExpression):
+    callee = expr.name.name
+    return callee != name and callee not in params and isinstance(bindings.get(callee), Function) \
+      and all(closed(arg, params, bindings, name) for arg in expr.args)
+
+  return False
+
+def size(expr):
+  if isinstance(expr, UnaryOperator):
+    return 1 + size(expr.value)
+  elif isinstance(expr, BinaryOperator):
+    return 1 + size(expr.left) + size(expr.right)
+  elif isinstance(expr, CallExpression):
+    return 1 + sum(size(arg) for arg in expr.args)
+  return 1
+
+def count_uses(expr, uses):
+  if isinstance(expr, IdentLiteral):
+    uses[expr.name] = uses.get(expr.name, 0) + 1
+  elif isinstance(expr, UnaryOperator):
+    count_uses(expr.value, uses)
+  elif isinstance(expr, BinaryOperator):
+    count_uses(expr.left, uses)
+    count_uses(expr.right, uses)
+  elif isinstance(expr, CallExpression):
+    for arg in expr.args:
+      count_uses(arg, uses)
+
+# Arguments are read where they are used, so they can't have side effects of their own
+def call_free(expr):
+  if isinstance(expr, LITERALS):
+    return True
+  elif isinstance(expr, IdentLiteral):
+    return expr.index['type'] is None or isinstance(expr.index['index'], IdentLiteral)
+  elif isinstance(expr, UnaryOperator):
+    return call_free(expr.value)
+  elif isinstance(expr, BinaryOperator):
+    return call_free(expr.left) and call_free(expr.right)
+  return False
+
+# Copy of a closed expression with parameters replaced by their arguments.
+# Calls are copied since folding them again rewrites their arguments in place.
+def substitute(expr, args):
+  if isinstance(expr, IdentLiteral):
+    return args[expr.name]
+  elif isinstance(expr, UnaryOperator):
+    return UnaryOperator(expr.operator, substitute(expr.value, args))
+  elif isinstance(expr, BinaryOperator):
+    return BinaryOperator(expr.operator, substitute(expr.left, args), substitute(expr.right, args))
+  elif isinstance(expr, CallExpression):
+    return CallExpression(expr.name, [substitute(arg, args) for arg in expr.args])
+  return expr
+
+# Number of nodes in an AST, parameters and object literals included
+def count_nodes(node):
+  if isinstance(node, list):
+    return sum(count_nodes(n) for n in node)
+  elif isinstance(node, dict):
+    return sum(count_nodes(v) for v in node.values())
+  elif node is None or isinstance(node, (str, int, float, tuple)):
+    return 0
+
+  # Operators' inline caches are tuples. Some nodes have a single slot written as a plain string, identifiers have no slots
+  fields = getattr(node, '__slots__', None)
+  if fields is None:
+    values = vars(node).values()
+  else:
+    values = [getattr(node, field) for field in ((fields,) if isinstance(fields, str) else fields)]
+  return 1 + sum(count_nodes(v) for v in values)
+
+def format_report(report):
+  lines = [f"{'pass':<10}{'time':>13}  nodes"]
+  for name, seconds, before, after in report:
+    lines.append(f"{name:<10}{seconds * 1000:>10.3f} ms  {before} -> {after}")
+  total = sum(seconds for _, seconds, _, _ in report)
+  lines.append(f"{'total':<10}{total * 1000:>10.3f} ms")
+  return '\n'.join(lines)
+
+# Drop top level functions that can't be reached from the program's statements.
+# Imports run code that can call anything by name, so nothing is dropped with them.
+def prune_functions(ast):
+  functions, statements = {}, []
+  for expr in ast:
+    if isinstance(expr, Function):
+      if expr.name in functions:
+        return ast
+      functions[expr.name] = expr
+    else:
+      statements.append(expr)
+
+  used = set()
+  if not collect_names(statements, used):
+    return ast
+
+  pending = list(used)
+  while pending:
+    name = pending.pop()
+    if name in functions:
+      found = set()
+      if not collect_names(functions[name].body, found):
+        return ast
+      pending.extend(found - used)
+      used |= found
+
+  return [expr for expr in ast if not isinstance(expr, Function) or expr.name in used]
+
+# Add every name called or read to names, returning False if there is an import
+def collect_names(node, names):
+  if isinstance(node, list):
+    return all(collect_names(n, names) for n in node)
+
+  elif isinstance(node, Module):
+    return False
+
+  elif isinstance(node, IdentLiteral):
+    names.add(node.name)
+    return collect_names(node.index['index'], names)
+
+  elif isinstance(node, CallExpression):
+    return collect_names(node.name, names) and collect_names(node.args, names)
+
+  elif isinstance(node, UnaryOperator):
+    return collect_names(node.value, names)
+
+  elif isinstance(node, BinaryOperator):
+    return collect_names(node.left, names) and collect_names(node.right, names)
+
+  elif isinstance(node, (Assignment, Return)):
+    return collect_names(node.value, names)
+
+  elif isinstance(node, Conditional):
+    return collect_names(node.expression, names) and collect_names(node.body, names) \
+      and collect_names(node.else_body or [], names)
+
+  elif isinstance(node, Loop):
+    return collect_names([node.init, node.condition, node.step], names) and collect_names(node.body, names)
+
+  elif isinstance(node, Function):
+    return collect_names(node.body, names) and all(collect_names(p.default, names) for p in node.params)
+
+  return True
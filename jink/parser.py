@@ -1,6 +1,7 @@
 from jink.utils.names import *
 from jink.utils.classes import *
 from jink.utils.future_iter import FutureIter
+from jink.utils.token_stream import TokenStream
 from jink.utils.func import pickle
 import json
 
@@ -9,6 +10,7 @@ PRNTLINE = "\n--------------------------------\n"
 class Parser:
   def __init__(self):
     self.tokens = None
+    self.loops = 0
 
   def consume(self, item, soft=False):
     """Removes expected token, given a type or a tuple of types."""
@@ -41,19 +43,23 @@ class Parser:
         raise Exception(f"Expected '{item}', got '{current.type}' on line {current.line}.")
 
   def parse(self, tokens, verbose=False):
-    self.tokens = FutureIter(tokens)
-    ast = []
-    while self.tokens.current is not None:
-      if self.tokens.current.type != TokenType.NEWLINE:
-        ast.append(self.parse_top())
-      else:
-        self.tokens._next()
+    ast = list(self.parse_statements(tokens))
 
     if verbose:
       print("AST:", PRNTLINE, json.dumps(pickle(ast), indent=2), PRNTLINE)
 
     return ast
 
+  # Yields each top level statement as soon as it is parsed, so tokens
+  # can be pulled lazily from the lexer
+  def parse_statements(self, tokens):
+    self.tokens = tokens.cursor() if isinstance(tokens, TokenStream) else FutureIter(tokens)
+    while self.tokens.current is not None:
+      if self.tokens.current.type != TokenType.NEWLINE:
+        yield self.parse_top()
+      else:
+        self.tokens._next()
+
   def parse_literal(self, tokens):
     return self.parse(tokens)
 
@@ -104,6 +110,17 @@ class Parser:
     elif init.value == 'if':
       return self.parse_conditional()
 
+    # Loops
+    elif init.value in ('while', 'for'):
+      return self.parse_loop()
+
+    elif init.value in ('break', 'continue'):
+      self.tokens._next()
+      if not self.loops:
+        raise Exception(f"Unexpected '{init.value}' outside of a loop on line {init.line}.")
+      self.consume(TokenType.SEMICOLON, soft=True)
+      return Break() if init.value == 'break' else Continue()
+
     # Null
     elif init.value == 'null':
       self.tokens._next()
@@ -112,7 +129,8 @@ class Parser:
     else:
       raise Exception(f"Expected keyword, got '{init.value}' on line {init.line}.")
 
-  def parse_expr(self, precedence=0):
+  # Only a whole expression, not an operand, ends at a ';'
+  def parse_expr(self, precedence=0, end=True):
     left = self.parse_primary()
     current = self.tokens.current
 
@@ -125,12 +143,12 @@ class Parser:
       if self.is_left_associative(operator):
         next_precedence += 1
 
-      right = self.parse_expr(next_precedence)
+      right = self.parse_expr(next_precedence, False)
       left = BinaryOperator(operator.value, left, right)
 
       current = self.tokens.current
 
-    if current and current.type == TokenType.SEMICOLON:
+    if end and current and current.type == TokenType.SEMICOLON:
       self.consume(TokenType.SEMICOLON)
 
     return left
@@ -145,7 +163,7 @@ class Parser:
       if operator.value in ('-', '+', '!'):
         value = self.parse_primary()
         return UnaryOperator(operator.value, value)
-      value = self.parse_expr(self.get_precedence(operator))
+      value = self.parse_expr(self.get_precedence(operator), False)
       return UnaryOperator(operator.value, value)
 
     elif current.value == '(':
@@ -266,8 +284,14 @@ class Parser:
   def parse_function(self):
     ident = self.consume(TokenType.IDENTIFIER)
     params = self.parse_args_params('params')
-    body = self.parse_block()
-    return Function(ident.value, params, body)
+
+    # Loops around a definition can't be broken out of from its body
+    loops, self.loops = self.loops, 0
+    try:
+      body = self.parse_block()
+    finally:
+      self.loops = loops
+    return Function(ident.value, params, body, ident.line)
 
   # Parse function parameters and call arguments
   def parse_args_params(self, location):
@@ -356,7 +380,58 @@ class Parser:
 
     return Conditional(init.value, expr, body, else_body)
 
-  # Parse blocks for functions and conditionals
+  # Loop parsing. Any part of a for loop's header can be left out, a missing
+  # condition always passing; its init and step are assignments or increments.
+  def parse_loop(self):
+    init = self.tokens._next()
+    self.consume(TokenType.LPAREN)
+    start = step = None
+
+    if init.value == 'while':
+      condition = self.parse_expr()
+    else:
+      if self.tokens.current.type != TokenType.SEMICOLON:
+        start = self.parse_loop_assignment()
+      self.consume(TokenType.SEMICOLON)
+      if self.tokens.current.type == TokenType.SEMICOLON:
+        condition = BooleanLiteral('true')
+      else:
+        condition = self.parse_expr(end=False)
+      self.consume(TokenType.SEMICOLON)
+      if self.tokens.current.type != TokenType.RPAREN:
+        step = self.parse_loop_assignment(False)
+    self.consume(TokenType.RPAREN)
+
+    self.loops += 1
+    try:
+      body = self.parse_block()
+    finally:
+      self.loops -= 1
+    return Loop(init.value, start, condition, step, body)
+
+  # Assignments in a for loop's header end before ';' or ')' rather than at a newline;
+  # only the init can define a variable. Increments become assignments, as ++ and --
+  # don't change variables elsewhere.
+  def parse_loop_assignment(self, definition=True):
+    current = self.tokens.current
+    var_type = None
+    if current.type == TokenType.OPERATOR and current.value in ('++', '--'):
+      self.tokens._next()
+      return increment(self.consume(TokenType.IDENTIFIER).value, current.value)
+    elif definition and current.type == TokenType.KEYWORD and current.value in ('let', 'const'):
+      var_type = self.tokens._next().value
+
+    ident = self.consume(TokenType.IDENTIFIER)
+    current = self.tokens.current
+    if var_type is None and current.type == TokenType.OPERATOR and current.value in ('++', '--'):
+      self.tokens._next()
+      assignment = increment(ident.value, current.value)
+    else:
+      self.consume('=')
+      assignment = Assignment(var_type, IdentLiteral(ident.value), self.parse_expr(end=False))
+    return assignment
+
+  # Parse blocks for functions, conditionals and loops
   def parse_block(self):
     body = []
     if self.tokens.current.value == '{':
@@ -406,3 +481,6 @@ class Parser:
     if self.tokens.current.value != '}':
       raise Exception(f"Expected '}}', got '{self.tokens.current.value}' on line {self.tokens.current.line}.")
     return obj
+
+def increment(name, operator):
+  return Assignment(None, IdentLiteral(name), BinaryOperator(operator[0], IdentLiteral(name), IntegerLiteral(1)))
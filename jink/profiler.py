@@ -0,0 +1,99 @@
+import time
+
+# Name of the frame time spent outside of any Jink function is charged to
+PROGRAM = '<program>'
+
+class FunctionStats:
+  __slots__ = ('label', 'calls', 'inclusive', 'exclusive', 'active')
+  def __init__(self, label):
+    self.label = label
+    self.calls = 0
+    self.inclusive = 0.0
+    self.exclusive = 0.0
+
+    # Calls of this function currently running, so recursion isn't counted twice inclusively
+    self.active = 0
+
+# One node per distinct call stack, holding the time spent in it outside of its callees
+class StackNode:
+  __slots__ = ('time', 'children')
+  def __init__(self):
+    self.time = 0.0
+    self.children = {}
+
+# Records call counts and inclusive and exclusive time per Jink function by wrapping
+# the functions the backends define. A call costs two clock reads and a dict lookup.
+# Tail calls replace their caller's frame, so they're charged to the caller's caller.
+class Profiler:
+  def __init__(self, clock=time.perf_counter):
+    self.clock = clock
+    self.stats = {}
+    self.root = StackNode()
+
+    # Frames of running calls as [time spent in callees, stack node]
+    self.stack = [[0.0, self.root]]
+    self.started = None
+    self.elapsed = 0.0
+
+  def start(self):
+    self.started = self.clock()
+
+  def stop(self):
+    self.elapsed += self.clock() - self.started
+    self.root.time = self.elapsed - self.stack[0][0]
+
+  def wrap(self, function, name, line=None):
+    label = name if line is None else f"{name}:{line}"
+    stats = self.stats.get(label)
+    if stats is None:
+      stats = self.stats[label] = FunctionStats(label)
+    stack, clock = self.stack, self.clock
+
+    def profiled(scope, args):
+      children = stack[-1][1].children
+      node = children.get(label)
+      if node is None:
+        node = children[label] = StackNode()
+      frame = [0.0, node]
+      stack.append(frame)
+      stats.calls += 1
+      stats.active += 1
+      start = clock()
+      try:
+        return function(scope, args)
+      finally:
+        elapsed = clock() - start
+        stack.pop()
+        stack[-1][0] += elapsed
+        stats.active -= 1
+        if not stats.active:
+          stats.inclusive += elapsed
+        stats.exclusive += elapsed - frame[0]
+        node.time += elapsed - frame[0]
+
+    return profiled
+
+  # Functions that were called, the most expensive on their own first
+  def report(self):
+    return sorted((s for s in self.stats.values() if s.calls), key=lambda s: s.exclusive, reverse=True)
+
+  def format_report(self):
+    lines = [f"{'calls':>9}{'inclusive':>14}{'exclusive':>14}{'per call':>12}  function"]
+    for s in self.report():
+      lines.append(f"{s.calls:>9}{s.inclusive * 1000:>11.3f} ms{s.exclusive * 1000:>11.3f} ms"
+        f"{s.inclusive / s.calls * 1e6:>9.1f} us  {s.label}")
+    lines.append(f"{'':>9}{self.elapsed * 1000:>11.3f} ms{self.root.time * 1000:>11.3f} ms{'':>12}  {PROGRAM}")
+    return '\n'.join(lines)
+
+  # Lines of 'frame;frame;frame microseconds', as read by flamegraph.pl and speedscope
+  def folded(self):
+    lines = []
+    pending = [((PROGRAM,), self.root)]
+    while pending:
+      path, node = pending.pop()
+      micros = round(node.time * 1e6)
+      if micros > 0:
+        lines.append(f"{';'.join(path)} {micros}")
+      for label, child in node.children.items():
+        pending.append((path + (label,), child))
+    return '\n'.join(sorted(lines)) + '\n'
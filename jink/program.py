@@ -0,0 +1,61 @@
+from jink.lexer import Lexer
+from jink.parser import Parser
+from jink.optimizer import Optimizer
+from jink.interpreter import Interpreter, Environment
+from jink.closures import ClosureCompiler
+from jink.vm import VM, BytecodeCompiler
+from jink.budget import BudgetedInterpreter
+from jink.utils.values import NULL
+
+BACKENDS = ('interpreter', 'closures', 'vm')
+
+# Source lexed, parsed and optimized once, to be run any number of times. Running a
+# program only writes operators' inline caches to its AST, which are swapped whole,
+# and every run gets its own backend and Environment, so one Program can be shared
+# between callers and threads.
+# Top level definitions are kept, for callers to read from the environment.
+class Program:
+  __slots__ = ('ast', 'code', 'backend', 'file_dir')
+  def __init__(self, ast, backend='interpreter', file_dir=None):
+    if backend not in BACKENDS:
+      raise Exception(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}.")
+
+    self.ast = ast
+    self.backend = backend
+    self.file_dir = file_dir
+
+    # The VM's bytecode doesn't depend on the run either; closures capture their compiler
+    self.code = BytecodeCompiler().compile(ast) if backend == 'vm' else None
+
+  # Run in env, or a new environment with the builtins, with globals defined in it
+  # first. Python functions given as globals are called with the arguments passed
+  # to them in Jink. A Budget bounds the run on the interpreter, raising BudgetExceeded
+  # once it runs out. Returns the value of each top level statement.
+  def run(self, globals=None, env=None, budget=None):
+    if env is None:
+      env = Environment()
+      env.add_builtins()
+    define_globals(env, globals)
+
+    if budget is not None:
+      if self.backend != 'interpreter':
+        raise Exception(f"Budgets are only supported by the interpreter, not {self.backend}.")
+      return BudgetedInterpreter(budget).evaluate(self.ast, env, file_dir=self.file_dir)
+    elif self.backend == 'vm':
+      return VM().run(self.code, env, file_dir=self.file_dir)
+    elif self.backend == 'closures':
+      return ClosureCompiler().evaluate(self.ast, env, file_dir=self.file_dir)
+    return Interpreter().evaluate(self.ast, env, file_dir=self.file_dir)
+
+def define_globals(env, globals):
+  for name, value in (globals or {}).items():
+    if callable(value):
+      env.def_func(name, lambda scope, args, value=value: value(*args))
+    else:
+      env.set_var(name, NULL if value is None else value, 'let')
+
+# Names the program will be given as globals aren't known to the optimizer, so it
+# leaves them alone; level is an optimizer level, defaulting to the CLI's
+def compile(source, backend='interpreter', file_dir=None, level=None):
+  ast = Optimizer(level=level).optimize(Parser().parse(Lexer().tokenize(source)))
+  return Program(ast, backend, file_dir)
@@ -4,45 +4,103 @@ from jink.parser import Parser
 from jink.optimizer import Optimizer
 from jink.interpreter import Interpreter, Environment
 from jink.utils.classes import TokenType
+from jink.utils.values import Cell, to_string
 
+OPENING = (TokenType.LPAREN, TokenType.LBRACKET, TokenType.LBRACE)
+CLOSING = (TokenType.RPAREN, TokenType.RBRACKET, TokenType.RBRACE)
+
+# Each line is lexed once as it comes in. Input runs once every bracket opened in it
+# is closed, so functions and conditionals can span lines. The lexer, parser and
+# optimizer are kept between inputs; constants and functions the optimizer learned
+# about are only kept once the input defining them ran without an exception.
 class REPL:
-  def __init__(self, stdin, stdout, environment=Environment(), lexer=Lexer(), parser=Parser(), interpreter=Interpreter(), verbose=False, file_dir=None):
+  def __init__(self, stdin, stdout, environment=None, lexer=None, parser=None, interpreter=None, verbose=False, file_dir=None):
+    if environment is None:
+      environment = Environment()
+      environment.add_builtins()
+
     self.stdin = stdin
     self.stdout = stdout
     self.verbose = verbose
     self.dir = file_dir
     self.env = environment
-    self.lexer = lexer
-    self.parser = parser
-    self.interpreter = interpreter
+    self.lexer = lexer or Lexer()
+    self.parser = parser or Parser()
+    self.optimizer = Optimizer()
+    self.interpreter = interpreter or Interpreter()
+
+    # Tokens of input still waiting on closing brackets
+    self.pending = []
+    self.depth = 0
 
   def main_loop(self):
     while True:
-      self.stdout.write("> ")
+      self.stdout.write("... " if self.pending else "> ")
       self.stdout.flush()
       try:
-        line = input()
+        line = self.stdin.readline()
       except KeyboardInterrupt:
         sys.exit(0)
-      if not line:
+      if not line or not (line.strip() or self.pending):
         break
-      self.run(line)
+      self.feed(line)
 
+  # Run code of one or more lines, as if it was typed in
   def run(self, code):
-    if code == 'exit':
+    for line in code.split('\n'):
+      self.feed(line)
+    if self.pending:
+      self.reset()
+      self.write("Exception: Unexpected end of input, expected a closing bracket.")
+
+  # Take a line of input, returning whether everything entered so far was run
+  def feed(self, line):
+    if not self.pending and line.strip() == 'exit':
       sys.exit(0)
+
     try:
-      lexed = self.lexer.parse(code)
-      if len(lexed) == 1 and lexed[0].type == TokenType.IDENTIFIER:
-        var = self.env.get_var(lexed[0].value)
-        ret = var['value'] if var != None and isinstance(var, (dict)) else var or 'null'
-        print(ret)
+      self.lexer.first_line = self.lexer.line
+      tokens = self.lexer.parse(line.rstrip('\n') + '\n')
+    except Exception as exception:
+      self.reset()
+      self.write(f"Exception: {exception}")
+      return True
+
+    for token in tokens:
+      if token.type in OPENING:
+        self.depth += 1
+      elif token.type in CLOSING:
+        self.depth -= 1
+    self.pending.extend(tokens)
+    if self.depth > 0:
+      return False
+
+    tokens = self.pending
+    self.reset()
+    self.execute(tokens)
+    return True
+
+  def reset(self):
+    self.pending = []
+    self.depth = 0
+
+  def execute(self, tokens):
+    try:
+      significant = [token for token in tokens if token.type != TokenType.NEWLINE]
+      if not significant:
+        return
+
+      if len(significant) == 1 and significant[0].type == TokenType.IDENTIFIER:
+        var = self.env.get_var(significant[0].value)
+        self.write(to_string(var.value if type(var) is Cell else var))
       else:
-        AST = Optimizer().optimize(self.parser.parse(lexed, verbose=self.verbose), verbose=self.verbose)
+        AST = self.optimizer.optimize(self.parser.parse(tokens, verbose=self.verbose), verbose=self.verbose)
         e = self.interpreter.evaluate(AST, self.env, verbose=self.verbose, file_dir=self.dir)
-        if len(e) == 1:
-          print(e[0] if e[0] is not None else 'null')
-        else:
-          print(e[0] if e[0] is not None else 'null')
+        self.optimizer.bindings = self.optimizer.defined
+        if e:
+          self.write(to_string(e[-1]))
     except Exception as exception:
-      print("Exception: {}".format(exception))
+      self.write(f"Exception: {exception}")
+
+  def write(self, value):
+    self.stdout.write(f"{value}\n")
@@ -0,0 +1,194 @@
+from jink.interpreter import Frame
+from jink.modules import find_module, parse_module
+from jink.utils.classes import *
+from jink.utils.values import NULL
+
+# Compile-time picture of a frame; maps names to their slot and how they were declared
+class Scope:
+  __slots__ = ('names', 'parent', 'size')
+  def __init__(self, parent=None):
+    self.names = {}
+    self.parent = parent
+    self.size = 0
+
+  def declare(self, name, var_type):
+    slot = self.size
+    self.names[name] = (slot, var_type)
+    self.size += 1
+    return slot
+
+  # Returns (depth, slot, var_type) or None if the name is not visible
+  def find(self, name):
+    scope, depth = self, 0
+    while scope:
+      if name in scope.names:
+        slot, var_type = scope.names[name]
+        return depth, slot, var_type
+      scope = scope.parent
+      depth += 1
+
+# Rewrites identifiers in the optimized AST to (depth, slot) addresses.
+# Scoping becomes lexical: a function's frame hangs off the frame it was defined in.
+# Undefined names, redefinitions and constant reassignments are reported here
+# so the interpreter never checks for them while running.
+class Resolver:
+  def __init__(self, env, file_dir=None, verbose=False):
+    self.dir = file_dir
+    self.verbose = verbose
+    self.scope = Scope()
+    self.pending = []
+
+    # Paths of modules being resolved and the stamps of those already resolved
+    self.loading = set()
+    self.modules = {}
+
+    # Builtins and anything else already defined become the first global slots
+    self.frame = Frame(0)
+    for name, value in env.index.items():
+      self.scope.declare(name, 'function' if callable(value) else value.var_type)
+      self.frame.slots.append(value)
+
+  def resolve(self, ast):
+    if ast is None:
+      raise Exception("AST not found")
+    resolved = self.resolve_scope(ast, self.scope)
+
+    # Grow the global frame for whatever this program defined
+    self.frame.slots.extend([NULL] * (self.scope.size - len(self.frame.slots)))
+    return resolved
+
+  # Resolve a function body or the top level. Function bodies are resolved once
+  # the enclosing scope is complete, so they can refer to names defined after them.
+  def resolve_scope(self, body, scope):
+    outer, self.pending = self.pending, []
+    resolved = self.resolve_block(body, scope)
+    pending, self.pending = self.pending, outer
+
+    for node, func, func_scope in pending:
+      node.body = self.resolve_scope(func.body, func_scope)
+      node.size = func_scope.size
+    return resolved
+
+  # Conditional blocks share the scope they appear in
+  def resolve_block(self, body, scope):
+    resolved = []
+    for expr in body:
+      node = self.resolve_node(expr, scope)
+
+      # Unpack modules
+      if isinstance(node, list):
+        resolved.extend(node)
+      else:
+        resolved.append(node)
+    return resolved
+
+  def resolve_node(self, expr, scope):
+    if isinstance(expr, IdentLiteral):
+      return self.resolve_ident(expr, scope)
+
+    elif isinstance(expr, UnaryOperator):
+      return UnaryOperator(expr.operator, self.resolve_node(expr.value, scope))
+
+    elif isinstance(expr, BinaryOperator):
+      return BinaryOperator(expr.operator, self.resolve_node(expr.left, scope), self.resolve_node(expr.right, scope))
+
+    # Like ModuleRegistry, a module is resolved where it's first imported and later
+    # imports, or ones in a cycle back to it, add nothing
+    elif isinstance(expr, Module):
+      path, key = find_module(expr, self.dir)
+      if path in self.loading or self.modules.get(path) == key:
+        return []
+
+      self.loading.add(path)
+      try:
+        resolved = self.resolve_block(parse_module(path, key, self.verbose), scope)
+      finally:
+        self.loading.discard(path)
+      self.modules[path] = key
+      return resolved
+
+    elif isinstance(expr, Assignment):
+      return self.resolve_assignment(expr, scope)
+
+    # Branches, like loops, share the frame they're in but keep what they define to themselves
+    elif isinstance(expr, Conditional):
+      expression = self.resolve_node(expr.expression, scope) if expr.expression is not None else None
+      names = scope.names
+      scope.names = dict(names)
+      body = self.resolve_block(expr.body, scope)
+      scope.names = dict(names)
+      else_body = self.resolve_block(expr.else_body, scope) if expr.else_body else expr.else_body
+      scope.names = names
+      return Conditional(expr.type, expression, body, else_body)
+
+    # Loops share the frame they're in, but what they define is only visible inside them
+    elif isinstance(expr, Loop):
+      names = dict(scope.names)
+      loop = Loop(
+        expr.type,
+        self.resolve_node(expr.init, scope) if expr.init is not None else None,
+        self.resolve_node(expr.condition, scope),
+        self.resolve_node(expr.step, scope) if expr.step is not None else None,
+        self.resolve_block(expr.body, scope)
+      )
+      scope.names = names
+      return loop
+
+    elif isinstance(expr, CallExpression):
+      return CallExpression(self.resolve_ident(expr.name, scope), [self.resolve_node(arg, scope) for arg in expr.args])
+
+    elif isinstance(expr, Function):
+      if scope.find(expr.name):
+        raise Exception(f"Function '{expr.name}' is already defined!")
+
+      node = ResolvedFunction(expr.name, expr.params, None, scope.declare(expr.name, 'function'), 0, expr.line)
+      func_scope = Scope(scope)
+      for p in expr.params:
+        func_scope.declare(p.name, p.type)
+      self.pending.append((node, expr, func_scope))
+      return node
+
+    elif isinstance(expr, Return):
+      return Return(self.resolve_node(expr.value, scope) if expr.value is not None else None)
+
+    return expr
+
+  def resolve_ident(self, expr, scope):
+    found = scope.find(expr.name)
+    if not found:
+      raise Exception(f"{expr.name} is not defined.")
+
+    depth, slot, _ = found
+    index = None
+
+    if expr.index['type'] == 'prop' and expr.index['index'] is not None:
+      prop = expr.index['index']
+
+      # Property names are looked up on the object, calls are resolved as usual
+      if isinstance(prop, CallExpression):
+        prop = self.resolve_node(prop, scope)
+      index = { 'type': 'prop', 'index': prop }
+
+    return ResolvedIdent(expr.name, depth, slot, index)
+
+  def resolve_assignment(self, expr, scope):
+    name = expr.ident.name
+    value = self.resolve_node(expr.value, scope) if expr.value is not None else None
+    found = scope.find(name)
+
+    # Definitions
+    if expr.type:
+      if found:
+        raise Exception(f"{name} is already defined.")
+      return Assignment(expr.type, ResolvedIdent(name, 0, scope.declare(name, expr.type)), value)
+
+    # Assignments
+    if not found:
+      raise Exception(f"Expected let or const, got 'null' for {name}.")
+
+    depth, slot, var_type = found
+    if var_type == 'const':
+      raise Exception(f"Constant {name} is not reassignable.")
+    elif var_type == 'function':
+      raise Exception(f"Function '{name}' is not reassignable.")
+    return Assignment(None, ResolvedIdent(name, depth, slot), value)
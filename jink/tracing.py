@@ -0,0 +1,127 @@
+from jink.interpreter import Interpreter, Environment, TailCall
+from jink.utils import classes
+from jink.utils.classes import Module
+
+# Tracing is opt in by construction: a TracedEnvironment and a TracingInterpreter
+# take the place of the usual ones, so untraced runs don't check for hooks at all.
+
+class Event:
+  __slots__ = ()
+
+  def __repr__(self):
+    fields = ', '.join(f"{field}={describe(getattr(self, field))}" for field in self.__slots__)
+    return f"{type(self).__name__}({fields})"
+
+# A name being looked up from scope; found is the scope defining it, or None
+class ScopeLookup(Event):
+  __slots__ = ('name', 'scope', 'found')
+  def __init__(self, name, scope, found):
+    self.name, self.scope, self.found = name, scope, found
+
+# A variable or parameter being defined or assigned in scope
+class VariableSet(Event):
+  __slots__ = ('name', 'value', 'var_type', 'scope')
+  def __init__(self, name, value, var_type, scope):
+    self.name, self.value, self.var_type, self.scope = name, value, var_type, scope
+
+class CallEnter(Event):
+  __slots__ = ('name', 'line', 'args')
+  def __init__(self, name, line, args):
+    self.name, self.line, self.args = name, line, args
+
+# value is None when the function ended in a tail call, which enters its callee next
+class CallExit(Event):
+  __slots__ = ('name', 'line', 'value')
+  def __init__(self, name, line, value):
+    self.name, self.line, self.value = name, line, value
+
+# An import statement about to run; module is its name as written
+class Import(Event):
+  __slots__ = ('module', 'file_dir')
+  def __init__(self, module, file_dir):
+    self.module, self.file_dir = module, file_dir
+
+class NodeEvaluated(Event):
+  __slots__ = ('node', 'value')
+  def __init__(self, node, value):
+    self.node, self.value = node, value
+
+EVENTS = (ScopeLookup, VariableSet, CallEnter, CallExit, Import, NodeEvaluated)
+
+# Event groups by the names the CLI's --trace option takes
+EVENT_NAMES = {
+  'lookup': (ScopeLookup,),
+  'set': (VariableSet,),
+  'call': (CallEnter, CallExit),
+  'import': (Import,),
+  'node': (NodeEvaluated,)
+}
+
+def describe(value):
+  if isinstance(value, Environment):
+    return f"<scope {value._id}{f' {value.type}' if value.type else ''}>"
+  elif type(value).__module__ == classes.__name__:
+    return f"<{type(value).__name__}>"
+  return repr(value)
+
+# Hands events to the hooks registered for their class
+class Tracer:
+  def __init__(self):
+    self.hooks = {}
+
+  # Call hook with every event of the given classes, or of all of them
+  def add_hook(self, hook, *events):
+    for event in events or EVENTS:
+      self.hooks.setdefault(event, []).append(hook)
+
+  # Events nobody listens to aren't created
+  def emit(self, event, *fields):
+    hooks = self.hooks.get(event)
+    if hooks:
+      event = event(*fields)
+      for hook in hooks:
+        hook(event)
+
+class TracedEnvironment(Environment):
+  def __init__(self, parent=None, s_type=None, tracer=None):
+    super().__init__(parent, s_type)
+    self.tracer = tracer if tracer is not None else parent.tracer
+
+  def find_scope(self, name):
+    scope = super().find_scope(name)
+    self.tracer.emit(ScopeLookup, name, self, scope)
+    return scope
+
+  def set_var(self, name, value, var_type=None, fn_scoped=False):
+    value = super().set_var(name, value, var_type, fn_scoped)
+    self.tracer.emit(VariableSet, name, value, var_type, self)
+    return value
+
+class TracingInterpreter(Interpreter):
+  def __init__(self, tracer):
+    super().__init__()
+    self.tracer = tracer
+
+  def evaluate_top(self, expr):
+    if isinstance(expr, Module):
+      names, index = [], expr
+      while index:
+        names.insert(0, index.name)
+        index = index.index
+      self.tracer.emit(Import, ''.join(names), self.dir)
+
+    value = super().evaluate_top(expr)
+    self.tracer.emit(NodeEvaluated, expr, value)
+    return value
+
+  def wrap_function(self, function, func):
+    function = super().wrap_function(function, func)
+    name, line, tracer = func.name, func.line, self.tracer
+
+    def traced(scope, args):
+      tracer.emit(CallEnter, name, line, args)
+      value = function(scope, args)
+      tracer.emit(CallExit, name, line, None if type(value) is TailCall else value)
+      return value
+
+    return traced
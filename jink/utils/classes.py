@@ -21,6 +21,7 @@ class TokenType(Enum):
 
 
 class Token:
+  __slots__ = ('type', 'value', 'line', 'pos')
   def __init__(self, _type, value, line, pos):
     self.type, self.value, self.line, self.pos = _type, value, line, pos
   def __str__(self):
@@ -31,14 +32,16 @@ class Token:
 
 
 class BinaryOperator:
-  __slots__ = ('operator', 'left', 'right')
+  __slots__ = ('operator', 'left', 'right', 'cache')
   def __init__(self, operator, left, right):
     self.operator, self.left, self.right = operator, left, right
+    self.cache = UNCACHED
 
 class UnaryOperator:
-  __slots__ = ('operator', 'value')
+  __slots__ = ('operator', 'value', 'cache')
   def __init__(self, operator, value):
     self.operator, self.value = operator, value
+    self.cache = UNCACHED
 
 class IntegerLiteral:
   __slots__ = ('value')
@@ -64,9 +67,15 @@ class IdentLiteral:
   def __init__(self, name, index={ 'type': None, 'index': None }):
     self.name, self.index = name, index
 
+# Identifier addressed by the Resolver; depth counts frames up from the current one
+class ResolvedIdent:
+  __slots__ = ('name', 'depth', 'slot', 'index')
+  def __init__(self, name, depth, slot, index=None):
+    self.name, self.depth, self.slot, self.index = name, depth, slot, index
+
 class Null:
-  def __init__(self, value):
-    self.value = "null"
+  def __init__(self, value="null"):
+    self.value = value
 
 
 class Assignment:
@@ -79,10 +88,17 @@ class CallExpression:
   def __init__(self, name, args):
     self.name, self.args = name, args
 
+# line is where the function is defined, for profiles
 class Function:
-  __slots__ = ('name', 'params', 'body')
-  def __init__(self, name, params, body):
-    self.name, self.params, self.body = name, params, body
+  __slots__ = ('name', 'params', 'body', 'line')
+  def __init__(self, name, params, body, line=None):
+    self.name, self.params, self.body, self.line = name, params, body, line
+
+# Function whose body was resolved; size is the number of slots its frame needs
+class ResolvedFunction:
+  __slots__ = ('name', 'params', 'body', 'slot', 'size', 'line')
+  def __init__(self, name, params, body, slot, size, line=None):
+    self.name, self.params, self.body, self.slot, self.size, self.line = name, params, body, slot, size, line
 
 class FunctionParameter:
   __slots__ = ('name', 'type', 'default')
@@ -99,6 +115,19 @@ class Conditional:
   def __init__(self, _type, expression, body, else_body):
     self.type, self.expression, self.body, self.else_body = _type, expression, body, else_body
 
+# while loops only have a condition; a for loop's init runs once and its step after
+# each pass through the body
+class Loop:
+  __slots__ = ('type', 'init', 'condition', 'step', 'body')
+  def __init__(self, _type, init, condition, step, body):
+    self.type, self.init, self.condition, self.step, self.body = _type, init, condition, step, body
+
+class Break:
+  __slots__ = ()
+
+class Continue:
+  __slots__ = ()
+
 class Module:
   __slots__ = ('name', 'index')  
   def __init__(self, name, index):
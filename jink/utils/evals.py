@@ -1,22 +1,71 @@
+import operator
+from jink.utils.values import NULL, to_string
+
+# Booleans and null joined to a string read the way they print
+def plus(x, y):
+  try:
+    return x + y
+  except TypeError:
+    if isinstance(x, str) and (isinstance(y, bool) or y is NULL):
+      return x + to_string(y)
+    elif isinstance(y, str) and (isinstance(x, bool) or x is NULL):
+      return to_string(x) + y
+    raise
+
 BINOP_EVALS = {
-  '+': lambda x, y: 0 if x + y is None else x + y,
-  '-': lambda x, y: 0 if x - y is None else x - y,
-  '/': lambda x, y: 0 if x / y is None else x / y,
-  '//': lambda x, y: 0 if x // y is None else x // y,
-  '*': lambda x, y: 0 if x * y is None else x * y,
-  '^': lambda x, y: 0 if x ** y is None else x ** y,
-  '>': lambda x, y: 'true' if x > y else 'false',
-  '<': lambda x, y: 'true' if x < y else 'false',
-  '>=': lambda x, y: 'true' if x >= y else 'false',
-  '<=': lambda x, y: 'true' if x <= y else 'false',
-  '==': lambda x, y: 'true' if x == y else 'false',
-  '!=': lambda x, y: 'true' if x != y else 'false'
+  '+': plus,
+  '-': operator.sub,
+  '/': operator.truediv,
+  '//': operator.floordiv,
+  '*': operator.mul,
+  '^': operator.pow,
+  '>': operator.gt,
+  '<': operator.lt,
+  '>=': operator.ge,
+  '<=': operator.le,
+  '==': operator.eq,
+  '!=': operator.ne
 }
 
 UNOP_EVALS = {
-  '!': lambda x: 'true' if x else 'false',
-  '-': lambda x: 0 if x - x * 2 is None else x - x * 2,
-  '++': lambda x: 0 if x + 1 is None else x + 1,
+  '!': lambda x: not truthy(x),
+  '-': operator.neg,
+  '++': lambda x: x + 1,
   '++:post': lambda x: 0 if x is None else x,
-  '--': lambda x: 0 if x - 1 is None else x - 1
+  '--': lambda x: x - 1
 }
+
+# Operations that need no conversions when both operands are of one of the types
+# given, so a node that keeps seeing them can call the operation straight away
+COMPARISONS = ('>', '<', '>=', '<=', '==', '!=')
+FAST_BINOPS = { (op, t): BINOP_EVALS[op] for op in BINOP_EVALS for t in (int, float) }
+FAST_BINOPS.update({ (op, str): BINOP_EVALS[op] for op in COMPARISONS })
+FAST_BINOPS.update({ ('+', t): operator.add for t in (int, float, str) })
+FAST_UNOPS = { (op, t): UNOP_EVALS[op] for op in ('-', '++', '--') for t in (int, float) }
+FAST_UNOPS['!', bool] = operator.not_
+
+# Operator nodes carry an inline cache of the operand type they last saw and the
+# operation for it; backends call that directly while operands keep that type and
+# come here otherwise. The pair is replaced whole, so runs sharing an AST only ever
+# see a pair that belongs together.
+UNCACHED = (None, None)
+
+def binary(expr, left, right):
+  t = type(left)
+  fast = FAST_BINOPS.get((expr.operator, t)) if type(right) is t else None
+  if fast is not None:
+    expr.cache = (t, fast)
+    return fast(left, right)
+  return BINOP_EVALS[expr.operator](left, right)
+
+def unary(expr, value):
+  t = type(value)
+  fast = FAST_UNOPS.get((expr.operator, t))
+  if fast is not None:
+    expr.cache = (t, fast)
+    return fast(value)
+  return UNOP_EVALS[expr.operator](value)
+
+# Whether a condition passes; false, null and missing values fail
+def truthy(value):
+  return not (value is None or value is False or value is NULL)
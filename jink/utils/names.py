@@ -9,6 +9,7 @@ TYPES = (
 
 KEYWORDS = (
   'if', 'else', 'elseif',
+  'while', 'for', 'break', 'continue',
   'import',
   'return', 'delete', 'void',
   'true', 'false', 'null',
@@ -0,0 +1,31 @@
+import mmap
+
+# Reads a source file in pieces of about `size` bytes, each ending on a line break.
+# The file is memory-mapped when possible so it is never held in memory whole.
+def read_source(path, size=1 << 16):
+  with open(path, 'rb') as f:
+    try:
+      data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+      data = None
+
+    # Empty files and some special files can't be mapped, read those line by line
+    if data is None:
+      f.seek(0)
+      while True:
+        lines = f.readlines(size)
+        if not lines:
+          return
+        yield decode(b''.join(lines))
+
+    with data:
+      start, end = 0, len(data)
+      while start < end:
+        cut = data.find(b'\n', min(start + size, end) - 1)
+        stop = end if cut == -1 else cut + 1
+        yield decode(data[start:stop])
+        start = stop
+
+# Newlines are normalized as they are when reading in text mode
+def decode(raw):
+  return raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
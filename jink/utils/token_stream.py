@@ -0,0 +1,92 @@
+import re
+from array import array
+from jink.utils.classes import Token, TokenType
+
+ESCAPES = re.compile(r'\\(.)', re.S)
+
+TYPES = list(TokenType)
+NEWLINE = TokenType.NEWLINE.value
+STRING = TokenType.STRING.value
+
+# Tokens kept as parallel arrays of type codes, source offsets, lines and positions.
+# Values and Token objects are only built when something asks for them.
+class TokenStream:
+  CODES = { t: t.value for t in TokenType }
+
+  __slots__ = ('source', 'types', 'starts', 'ends', 'lines', 'positions')
+  def __init__(self, source):
+    self.source = source
+    self.types = array('B')
+    self.starts = array('i')
+    self.ends = array('i')
+    self.lines = array('i')
+    self.positions = array('i')
+
+  def __len__(self):
+    return len(self.types)
+
+  def __iter__(self):
+    return (self.token(i) for i in range(len(self.types)))
+
+  def type(self, i):
+    return TYPES[self.types[i]]
+
+  def value(self, i):
+    _type = self.types[i]
+    if _type == NEWLINE:
+      return 'newline'
+
+    value = self.source[self.starts[i]:self.ends[i]]
+    if _type == STRING:
+      return unescape(value[1:-1])
+    return value
+
+  def token(self, i):
+    return Token(TYPES[self.types[i]], self.value(i), self.lines[i], self.positions[i])
+
+  # Line the lexer was on where token i starts. A string has the line it ends on,
+  # the lexer counting each \n escape in it as a line break.
+  def start_line(self, i):
+    line = self.lines[i]
+    if self.types[i] == STRING:
+      line -= sum(m.group(1) == 'n' for m in ESCAPES.finditer(self.source, self.starts[i] + 1, self.ends[i] - 1))
+    return line
+
+  def cursor(self):
+    return TokenCursor(self)
+
+# Walks a TokenStream with the same current/_next interface as FutureIter,
+# materializing one token at a time
+class TokenCursor:
+  __slots__ = ('stream', 'index', 'end', 'current')
+  def __init__(self, stream, index=0):
+    self.stream = stream
+    self.index = index
+    self.end = len(stream)
+    self.current = stream.token(index) if index < self.end else None
+
+  def _next(self):
+    t = self.current
+    i = self.index = self.index + 1
+
+    if i >= self.end:
+      self.current = None
+      return t
+
+    # Same as TokenStream.token, inlined since the parser calls this for every token
+    stream = self.stream
+    _type = stream.types[i]
+    if _type == NEWLINE:
+      value = 'newline'
+    else:
+      value = stream.source[stream.starts[i]:stream.ends[i]]
+      if _type == STRING:
+        value = unescape(value[1:-1])
+    self.current = Token(TYPES[_type], value, stream.lines[i], stream.positions[i])
+    return t
+
+# Escaped characters stand for themselves, except \n
+def unescape(value):
+  if '\\' not in value:
+    return value
+  return ESCAPES.sub(lambda m: '\n' if m.group(1) == 'n' else m.group(1), value)
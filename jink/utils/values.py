@@ -0,0 +1,61 @@
+from jink.utils import classes
+
+# Values at run time are Python ints, floats, strings, dicts for objects, real
+# booleans and NULL. They're only turned into Jink's text for them when printed,
+# made into strings or joined to a string.
+
+class NullType:
+  __slots__ = ()
+
+  def __repr__(self):
+    return 'null'
+
+  def __bool__(self):
+    return False
+
+  # Copies stay the one null
+  def __reduce__(self):
+    return 'NULL'
+
+NULL = NullType()
+
+TYPES = {
+  bool: 'bool',
+  int: 'int',
+  float: 'float',
+  str: 'string',
+  dict: 'obj',
+  NullType: 'null'
+}
+
+# A variable. Its type name is looked up once per assignment rather than per read.
+class Cell:
+  __slots__ = ('value', 'type', 'var_type')
+  def __init__(self, value, var_type):
+    self.value = value
+    self.type = TYPES.get(type(value))
+    self.var_type = var_type
+
+  def set(self, value):
+    self.value = value
+    self.type = TYPES.get(type(value))
+
+  def __repr__(self):
+    return f"Cell({self.value!r}, {self.type}, {self.var_type})"
+
+def to_string(value):
+  if value is True:
+    return 'true'
+  elif value is False:
+    return 'false'
+  elif value is None or value is NULL:
+    return 'null'
+  return str(value)
+
+# The value a literal node evaluates to; parameters without a default get null
+def literal_value(expr):
+  if expr is None or isinstance(expr, classes.Null):
+    return NULL
+  elif isinstance(expr, classes.BooleanLiteral):
+    return expr.value == 'true'
+  return getattr(expr, 'value', NULL)
@@ -0,0 +1,499 @@
+import marshal
+from array import array
+from jink.modules import ModuleRegistry
+from jink.utils.classes import *
+from jink.utils.evals import *
+from jink.utils.values import NULL, Cell, literal_value
+
+# Opcodes - every instruction is an opcode followed by a single operand
+LOAD_CONST = 0
+LOAD_NAME = 1
+LOAD_PROP = 2
+STORE = 3
+STORE_LET = 4
+STORE_CONST = 5
+BINARY = 6
+UNARY = 7
+CALL = 8
+RETURN = 9
+JUMP = 10
+JUMP_IF_FALSE = 11
+POP = 12
+MAKE_FUNCTION = 13
+IMPORT = 14
+EMIT = 15
+ENTER_SCOPE = 16
+CLEAR_SCOPE = 17
+EXIT_SCOPE = 18
+LOAD_NULL = 19
+
+OPNAMES = (
+  'LOAD_CONST', 'LOAD_NAME', 'LOAD_PROP', 'STORE', 'STORE_LET', 'STORE_CONST',
+  'BINARY', 'UNARY', 'CALL', 'RETURN', 'JUMP', 'JUMP_IF_FALSE', 'POP',
+  'MAKE_FUNCTION', 'IMPORT', 'EMIT', 'ENTER_SCOPE', 'CLEAR_SCOPE', 'EXIT_SCOPE',
+  'LOAD_NULL'
+)
+
+# Scopes ENTER_SCOPE makes, by its operand
+SCOPE_TYPES = ('loop', 'loop_body')
+
+BINARY_OPS = tuple(BINOP_EVALS)
+UNARY_OPS = tuple(UNOP_EVALS)
+BINARY_FUNCS = tuple(BINOP_EVALS.values())
+UNARY_FUNCS = tuple(UNOP_EVALS.values())
+
+STORES = { None: STORE, 'let': STORE_LET, 'const': STORE_CONST }
+STORE_TYPES = { STORE: None, STORE_LET: 'let', STORE_CONST: 'const' }
+
+# Bump whenever the instruction set or the dump layout changes
+FORMAT_VERSION = 4
+
+# A compiled unit; the main program, a function body or a module
+class Code:
+  __slots__ = ('name', 'params', 'code', 'consts', 'names', 'functions')
+  def __init__(self, name, params=()):
+    self.name, self.params = name, params
+    self.code = array('i')
+    self.consts = []
+    self.names = []
+    self.functions = []
+
+  def dumps(self):
+    return marshal.dumps((FORMAT_VERSION, self.to_tuple()))
+
+  @staticmethod
+  def loads(data):
+    version, code = marshal.loads(data)
+    if version != FORMAT_VERSION:
+      raise Exception(f"Unsupported bytecode version {version}, expected {FORMAT_VERSION}.")
+    return Code.from_tuple(code)
+
+  def to_tuple(self):
+    return (
+      self.name, self.params, self.code.tobytes(), tuple(self.consts),
+      tuple(self.names), tuple(f.to_tuple() for f in self.functions)
+    )
+
+  @staticmethod
+  def from_tuple(t):
+    name, params, code, consts, names, functions = t
+    unit = Code(name, params)
+    unit.code.frombytes(code)
+    unit.consts = list(consts)
+    unit.names = list(names)
+    unit.functions = [Code.from_tuple(f) for f in functions]
+    return unit
+
+  def disassemble(self, indent=''):
+    lines = [f"{indent}{self.name}:"]
+    for pc in range(0, len(self.code), 2):
+      op, arg = self.code[pc], self.code[pc + 1]
+      if op in (LOAD_NAME, STORE, STORE_LET, STORE_CONST):
+        detail = self.names[arg]
+      elif op in (LOAD_CONST, LOAD_PROP, IMPORT):
+        detail = repr(self.consts[arg])
+      elif op == BINARY:
+        detail = BINARY_OPS[arg]
+      elif op == UNARY:
+        detail = UNARY_OPS[arg]
+      elif op == MAKE_FUNCTION:
+        detail = self.functions[arg].name
+      elif op in (JUMP, JUMP_IF_FALSE):
+        detail = arg // 2
+      elif op == ENTER_SCOPE:
+        detail = SCOPE_TYPES[arg]
+      else:
+        detail = arg
+      lines.append(f"{indent}  {pc // 2:>4} {OPNAMES[op]:<14} {detail}")
+    for f in self.functions:
+      lines.append(f.disassemble(indent + '  '))
+    return '\n'.join(lines)
+
+# Turns the optimized AST into flat bytecode
+class BytecodeCompiler:
+  def __init__(self):
+    self.loops = []
+
+  def compile(self, ast, name='<main>'):
+    self.unit = Code(name)
+    self.const_index, self.name_index = {}, {}
+    for expr in ast:
+      self.compile_node(expr)
+      self.emit(EMIT)
+    return self.unit
+
+  def emit(self, op, arg=0):
+    self.unit.code.append(op)
+    self.unit.code.append(arg)
+    return len(self.unit.code) - 1
+
+  # Point a jump emitted earlier at the current end of the code
+  def patch(self, operand):
+    self.unit.code[operand] = len(self.unit.code)
+
+  # Constants and names are indexed as they're added, so finding one doesn't scan the unit
+  def const(self, value):
+    consts = self.unit.consts
+    try:
+      key = (type(value), value)
+      return self.const_index[key]
+    except KeyError:
+      self.const_index[key] = len(consts)
+
+    # Objects can't be keys, they're compared one by one
+    except TypeError:
+      for i, c in enumerate(consts):
+        if type(c) is type(value) and c == value:
+          return i
+    consts.append(value)
+    return len(consts) - 1
+
+  def name(self, name):
+    index = self.name_index.get(name)
+    if index is None:
+      index = self.name_index[name] = len(self.unit.names)
+      self.unit.names.append(name)
+    return index
+
+  # Statements in a block leave only the last value behind
+  def compile_block(self, body):
+    if not body:
+      self.emit(LOAD_NULL)
+    for i, expr in enumerate(body):
+      if i > 0:
+        self.emit(POP)
+      self.compile_node(expr)
+
+  def compile_node(self, expr):
+    if isinstance(expr, IdentLiteral):
+      if None in (expr.index['type'], expr.index['index']):
+        self.emit(LOAD_NAME, self.name(expr.name))
+
+      elif expr.index['type'] == 'prop':
+        index = expr.index['index']
+        if isinstance(index, IdentLiteral):
+          self.emit(LOAD_PROP, self.const((expr.name, index.name)))
+
+        # TODO: Object methods, classes.
+        elif isinstance(index, CallExpression):
+          self.compile_node(index)
+
+        else:
+          self.emit(LOAD_NULL)
+
+    elif isinstance(expr, (StringLiteral, IntegerLiteral, FloatingPointLiteral)):
+      self.emit(LOAD_CONST, self.const(expr.value))
+
+    elif isinstance(expr, BooleanLiteral):
+      self.emit(LOAD_CONST, self.const(expr.value == 'true'))
+
+    # Constants are marshalled and NULL can't be, so null has its own instruction
+    elif isinstance(expr, Null):
+      self.emit(LOAD_NULL)
+
+    elif isinstance(expr, UnaryOperator):
+      self.compile_node(expr.value)
+      self.emit(UNARY, UNARY_OPS.index(expr.operator))
+
+    elif isinstance(expr, BinaryOperator):
+      self.compile_node(expr.left)
+      self.compile_node(expr.right)
+      self.emit(BINARY, BINARY_OPS.index(expr.operator))
+
+    elif isinstance(expr, Module):
+      index = []
+      while expr:
+        index.insert(0, expr.name)
+        expr = expr.index
+      self.emit(IMPORT, self.const(tuple(index)))
+
+    elif isinstance(expr, Assignment):
+      if expr.value is None:
+        self.emit(LOAD_NULL)
+      else:
+        self.compile_node(expr.value)
+      self.emit(STORES[expr.type], self.name(expr.ident.name))
+
+    elif isinstance(expr, Conditional):
+      if expr.expression is None:
+        self.compile_block(expr.body)
+        return
+
+      self.compile_node(expr.expression)
+      to_else = self.emit(JUMP_IF_FALSE)
+      self.compile_block(expr.body)
+      to_end = self.emit(JUMP)
+      self.patch(to_else)
+      if expr.else_body:
+        self.compile_node(expr.else_body[0])
+      else:
+        self.emit(LOAD_NULL)
+      self.patch(to_end)
+
+    elif isinstance(expr, Loop):
+      self.compile_loop(expr)
+
+    # Blocks leave nothing behind before a statement, so jumping out of one leaves the
+    # stack as the loop found it; the jumps are pointed at their targets once known
+    elif isinstance(expr, Break):
+      self.loops[-1][0].append(self.emit(JUMP))
+
+    elif isinstance(expr, Continue):
+      self.loops[-1][1].append(self.emit(JUMP))
+
+    elif isinstance(expr, CallExpression):
+      self.emit(LOAD_NAME, self.name(expr.name.name))
+      for arg in expr.args:
+        self.compile_node(arg)
+      self.emit(CALL, len(expr.args))
+
+    elif isinstance(expr, Function):
+      self.emit(MAKE_FUNCTION, self.compile_function(expr))
+
+    elif isinstance(expr, Return):
+      if expr.value is None:
+        self.emit(LOAD_NULL)
+      else:
+        self.compile_node(expr.value)
+      self.emit(RETURN)
+
+    elif isinstance(expr, dict):
+      self.emit(LOAD_CONST, self.const(expr))
+
+    else:
+      self.emit(LOAD_NULL)
+
+  # Loops run in a scope for their header and one for their body, made once per run of
+  # the loop; the body's is emptied after each pass. Like any statement, a loop leaves
+  # a value behind, null.
+  def compile_loop(self, expr):
+    breaks, continues = [], []
+    self.loops.append((breaks, continues))
+
+    self.emit(ENTER_SCOPE, SCOPE_TYPES.index('loop'))
+    if expr.init is not None:
+      self.compile_node(expr.init)
+      self.emit(POP)
+    self.emit(ENTER_SCOPE, SCOPE_TYPES.index('loop_body'))
+
+    start = len(self.unit.code)
+    self.compile_node(expr.condition)
+    breaks.append(self.emit(JUMP_IF_FALSE))
+    self.compile_block(expr.body)
+    self.emit(POP)
+
+    for operand in continues:
+      self.patch(operand)
+    self.emit(CLEAR_SCOPE)
+    if expr.step is not None:
+      self.compile_node(expr.step)
+      self.emit(POP)
+    self.emit(JUMP, start)
+
+    for operand in breaks:
+      self.patch(operand)
+    self.emit(EXIT_SCOPE)
+    self.emit(EXIT_SCOPE)
+    self.emit(LOAD_NULL)
+    self.loops.pop()
+
+  def compile_function(self, func):
+    params = tuple((p.name, p.type, default_const(p.default)) for p in func.params)
+    outer = self.unit, self.const_index, self.name_index
+    self.unit, self.const_index, self.name_index = Code(func.name, params), {}, {}
+    self.compile_block(func.body)
+    self.emit(POP)
+    self.emit(LOAD_NULL)
+    self.emit(RETURN)
+    function = self.unit
+    self.unit, self.const_index, self.name_index = outer
+    self.unit.functions.append(function)
+    return len(self.unit.functions) - 1
+
+# Parameter defaults as constants, None standing in for null
+def default_const(default):
+  value = literal_value(default)
+  return None if value is NULL else value
+
+# A Jink function living in the VM
+class VMFunction:
+  __slots__ = ('code', 'vm')
+  def __init__(self, code, vm):
+    self.code, self.vm = code, vm
+
+  # Calls from outside the VM, such as builtins, run the body in a nested loop
+  def __call__(self, scope, args):
+    bind_args(self.code, scope, args)
+    return self.vm.execute(self.code, scope, top_level=False)
+
+def bind_args(code, scope, args):
+  params = code.params
+
+  # Exception upon overload
+  if len(args) > len(params):
+    raise Exception(f"Function '{code.name}' takes {len(params)} arguments but {len(args)} were given.")
+
+  # If argument doesn't exist use function default if it exists
+  for i, (name, _type, default) in enumerate(params):
+    value = args[i] if i < len(args) else None
+    if value is None or value is NULL:
+      value = NULL if default is None else default
+    scope.set_var(name, value, _type, fn_scoped=True)
+
+# Runs bytecode with a single value stack and no Python recursion between Jink calls
+class VM:
+  def __init__(self):
+    self.dir = None
+    self.verbose = False
+    self.modules = ModuleRegistry()
+
+  # Same entry point as Interpreter.evaluate so either can drive the CLI and REPL
+  def evaluate(self, ast, env, verbose=False, file_dir=None):
+    self.verbose = verbose
+    self.dir = file_dir
+    code = BytecodeCompiler().compile(ast)
+    if verbose:
+      print(code.disassemble())
+    return self.execute(code, env)
+
+  def run(self, code, env, file_dir=None):
+    self.dir = file_dir
+    return self.execute(code, env)
+
+  # Run a program or module, collecting the value of each top level statement.
+  # Function bodies run with top_level off and hand back their return value.
+  def execute(self, code, env, top_level=True):
+    results = []
+    if not code.code:
+      return results
+    stack = []
+    push, pop = stack.append, stack.pop
+    frames = []
+    top = env
+    ops, consts, names, functions = code.code, code.consts, code.names, code.functions
+    pc = 0
+
+    while True:
+      op = ops[pc]
+      arg = ops[pc + 1]
+      pc += 2
+
+      if op == LOAD_NAME:
+        name = names[arg]
+        scope = env
+        while scope is not None:
+          if name in scope.index:
+            var = scope.index[name]
+            break
+          scope = scope.parent
+        else:
+          raise Exception(f"{name} is not defined.")
+        push(var.value if type(var) is Cell else var)
+
+      elif op == LOAD_CONST:
+        push(consts[arg])
+
+      elif op == LOAD_NULL:
+        push(NULL)
+
+      elif op == BINARY:
+        right = pop()
+        stack[-1] = BINARY_FUNCS[arg](stack[-1], right)
+
+      elif op == JUMP_IF_FALSE:
+        if not truthy(pop()):
+          pc = arg
+
+      elif op == JUMP:
+        pc = arg
+
+      elif op == CALL:
+        args = stack[len(stack) - arg:]
+        del stack[len(stack) - arg:]
+        func = pop()
+
+        if type(func) is VMFunction:
+          callee = func.code
+          scope = env.extend(f"call_{callee.name}")
+          bind_args(callee, scope, args)
+          frames.append((code, pc, env))
+          code, env, pc = callee, scope, 0
+          ops, consts, names, functions = code.code, code.consts, code.names, code.functions
+        else:
+          push(func(env, args))
+
+      elif op == RETURN:
+        value = pop()
+        if value is None:
+          value = NULL
+
+        if not frames:
+          if not top_level:
+            return value
+
+          # A return at the top level ends the statement it's in, loops included
+          stack.clear()
+          push({ 'type': 'return', 'value': value })
+          env = top
+          while ops[pc] != EMIT:
+            pc += 2
+          continue
+
+        code, pc, env = frames.pop()
+        ops, consts, names, functions = code.code, code.consts, code.names, code.functions
+        push(value)
+
+      elif op == POP:
+        pop()
+
+      elif op == EMIT:
+        value = pop()
+
+        # Unpack modules
+        if isinstance(value, list):
+          results.extend(value)
+        else:
+          results.append(value)
+
+        if pc == len(ops):
+          return results
+
+      elif op == UNARY:
+        stack[-1] = UNARY_FUNCS[arg](stack[-1])
+
+      elif op in (STORE, STORE_LET, STORE_CONST):
+        value = stack[-1]
+        stack[-1] = env.set_var(names[arg], NULL if value is None else value, STORE_TYPES[op])
+
+      elif op == CLEAR_SCOPE:
+        env.index.clear()
+
+      elif op == ENTER_SCOPE:
+        env = env.extend(SCOPE_TYPES[arg])
+
+      elif op == EXIT_SCOPE:
+        env = env.parent
+
+      elif op == LOAD_PROP:
+        name, prop = consts[arg]
+        var = env.get_var(name)
+        if var.type != 'obj':
+          raise Exception(f"Variable '{name}' of type {var.type} does not support indexing")
+        if prop not in var.value:
+          raise Exception(f"Object '{name}' does not contain the property '{prop}'")
+        push(var.value[prop])
+
+      elif op == MAKE_FUNCTION:
+        function = VMFunction(functions[arg], self)
+        env.def_func(function.code.name, function)
+        push(function)
+
+      elif op == IMPORT:
+        push(self.load_module(consts[arg], env))
+
+  def load_module(self, index, env):
+    expr = None
+    for name in index:
+      expr = Module(name, expr)
+    run = lambda ast: self.execute(BytecodeCompiler().compile(ast, name=f"<module {index[-1]}>"), env)
+    return self.modules.load(expr, self.dir, env, run, self.verbose)
@@ -1,10 +1,31 @@
+import io
+import asyncio
 import unittest
+import contextlib
+import tempfile
+from pathlib import Path
 from jink.lexer import Lexer
 from jink.parser import Parser
 from jink.optimizer import Optimizer
 from jink.interpreter import Interpreter, Environment
+from jink.closures import ClosureCompiler
+from jink.vm import VM, BytecodeCompiler, Code
+from jink.resolver import Resolver
+from jink.modules import AST_CACHE
+from jink import cache
+from jink.memo import Memo, find_pure
+from jink.profiler import Profiler
+from jink.repl import REPL
+from jink.incremental import Document
+from jink.batch import find_scripts, run_batch
+from jink import aio
+import jink
+from jink.budget import Budget, BudgetExceeded, BudgetedInterpreter
+from jink.tracing import Tracer, TracedEnvironment, TracingInterpreter, CallEnter, CallExit, VariableSet, ScopeLookup
 from jink.utils.classes import *
 from jink.utils.func import pickle
+from jink.utils.values import NULL, Cell
+from benchmarks.run import run_benchmarks, compare, regressions
 
 class LexerTest(unittest.TestCase):
   def setUp(self):
@@ -40,6 +61,36 @@ class LexerTest(unittest.TestCase):
     lexed = self.lexer.parse_literal(code)
     assert lexed == "['{TokenType.IDENTIFIER print}', '{TokenType.LPAREN (}', '{TokenType.STRING Hello world!}', '{TokenType.RPAREN )}']", "Issue in function call tokenization."
 
+  def test_operators(self):
+    """Ensures multi-character operators and comments are lexed properly."""
+    code = "x >= .5 // note\n"
+    lexed = self.lexer.parse_literal(code)
+    assert lexed == "['{TokenType.IDENTIFIER x}', '{TokenType.OPERATOR >=}', '{TokenType.NUMBER .5}', '{TokenType.NEWLINE newline}']", "Issue in operator tokenization."
+
+  def test_positions(self):
+    """Ensures line numbers are tracked through multi-line comments."""
+    code = "let a = 1 /* two\nlines */ + b\nc"
+    positions = [(token.value, token.line, token.pos) for token in self.lexer.parse(code)]
+    assert positions == [
+      ('let', 1, 1), ('a', 1, 3), ('=', 1, 5), ('1', 1, 7),
+      ('+', 2, 11), ('b', 2, 13), ('newline', 3, 14), ('c', 3, 15)
+    ], "Issue in token positions."
+
+  def test_token_stream(self):
+    """Ensures the token stream holds the same tokens as the token list."""
+    code = "let s = 'a\\'b' // c\nfun f(x) { return x * 2 }\n"
+    listed = [(t.type, t.value, t.line, t.pos) for t in Lexer().parse(code)]
+    stream = Lexer().tokenize(code)
+    assert len(stream) == len(listed), "Issue in token stream length."
+    assert [(t.type, t.value, t.line, t.pos) for t in stream] == listed, "Issue in token stream values."
+
+  def test_stream(self):
+    """Ensures source handed over in pieces lexes the same as the whole source."""
+    pieces = ["let s = 'one\n", "two' /* a\n", "comment */ + 1\n", "print(s)"]
+    listed = [(t.type, t.value, t.line, t.pos) for t in Lexer().parse(''.join(pieces))]
+    streamed = [(t.type, t.value, t.line, t.pos) for t in Lexer().parse_stream(pieces)]
+    assert streamed == listed, "Issue in streamed tokenization."
+
 
 class ParserTest(unittest.TestCase):
   def setUp(self):
@@ -103,6 +154,80 @@ class ParserTest(unittest.TestCase):
     )
     assert pickle(parsed) == pickle(test), "Issue in inline conditional parsing."
 
+  def test_token_stream(self):
+    """Ensures token streams parse to the same AST as token lists."""
+    code = "fun add(let a, let b) {\n  return a + b\n}\nprint(add(1, 2))\n"
+    parsed = self.parser.parse(self.lexer.parse(code))
+    streamed = Parser().parse(Lexer().tokenize(code))
+    assert pickle(streamed) == pickle(parsed), "Issue in token stream parsing."
+
+  def test_statements(self):
+    """Ensures statements are handed out before the rest of the source is lexed."""
+    pieces = iter(["let a = 1\n", "let b = 2\n", "@"])
+    statements = self.parser.parse_statements(self.lexer.parse_stream(pieces))
+    assert next(statements).ident.name == 'a', "Issue in streamed statement parsing."
+    assert next(pieces) == "@", "Issue in streamed statement parsing."
+
+class OptimizerTest(unittest.TestCase):
+  def optimize(self, code, prune=False):
+    return Optimizer(prune).optimize(Parser().parse(Lexer().parse(code)))
+
+  def test_const_propagation(self):
+    """Ensures constants are propagated into later expressions and folded."""
+    optimized = self.optimize("const a = 4\nconst b = a * 2 + 1\nlet c = b - a\nlet d = c * a\n")
+    assert pickle(optimized[2].value) == pickle(IntegerLiteral(5)), "Issue in constant propagation."
+    assert isinstance(optimized[3].value, BinaryOperator), "Issue in folding non-constant variables."
+
+  def test_dynamic_scope(self):
+    """Ensures constants aren't propagated into functions, where a caller can hide them."""
+    code = "const x = 1\nfun f() return x\nfun g(let x) {\n  let r = f()\n  return r\n}\nlet a = g(2)\n"
+    assert isinstance(self.optimize(code)[1].body[0].value, IdentLiteral), "Issue in keeping constants out of functions."
+    for backend in ('interpreter', 'closures', 'vm'):
+      assert jink.compile(code, backend).run()[-1] == 2, f"Issue in reading a caller's parameter on {backend}."
+
+  def test_conditionals(self):
+    """Ensures conditionals with known outcomes are replaced by their branch."""
+    code = "const debug = 1 > 2\nif (debug) {\n  print('a')\n} elseif (2 >= 2) {\n  print('b')\n} else {\n  print('c')\n}\n"
+    optimized = self.optimize(code)
+    assert pickle(optimized[1:]) == pickle([CallExpression(IdentLiteral('print'), [StringLiteral('b')])]), "Issue in conditional folding."
+
+  def test_dead_code(self):
+    """Ensures statements after a return and uncalled functions are removed."""
+    code = "fun unused() return 1\nfun f(let a) {\n  print(a)\n  return a\n  print(a)\n}\nprint(f(1))\n"
+    optimized = self.optimize(code, prune=True)
+    assert [type(e).__name__ for e in optimized] == ['Function', 'CallExpression'], "Issue in removing uncalled functions."
+    assert len(optimized[0].body) == 2, "Issue in removing unreachable statements."
+    assert len(self.optimize("import helper\n" + code, prune=True)) == 4, "Issue in keeping functions with imports."
+
+  def test_inlining(self):
+    """Ensures calls to small functions are replaced by their folded return expression."""
+    code = "fun double(let x) return x * 2\nfun quad(let x) return double(double(x))\nprint(quad(3))\nlet a = 1\nprint(quad(a))\n"
+    optimized = self.optimize(code, prune=True)
+    assert pickle(optimized[0].args) == pickle([IntegerLiteral(12)]), "Issue in inlining and refolding calls."
+    assert isinstance(optimized[2].args[0], BinaryOperator), "Issue in inlining calls with variable arguments."
+    assert len(optimized) == 3, "Issue in removing inlined functions."
+
+  def test_inlining_limits(self):
+    """Ensures recursive, shadowed and side effecting calls are left as calls."""
+    code = "fun f(let n) return f(n)\nfun sq(let x) return x * x\nfun g(let sq) return sq(1)\nprint(f(1))\nprint(sq(f(2)))\nprint(sq(1 + 2))\n"
+    optimized = self.optimize(code)
+    assert isinstance(optimized[0].body[0].value, CallExpression), "Issue in skipping recursive functions."
+    assert isinstance(optimized[2].body[0].value, CallExpression), "Issue in skipping shadowed functions."
+    assert [type(e.args[0]).__name__ for e in optimized[3:]] == ['CallExpression', 'CallExpression', 'IntegerLiteral'], "Issue in inlining arguments."
+
+  def test_levels(self):
+    """Ensures each optimization level runs its passes and reports them when timed."""
+    code = "fun double(let x) return x * 2\nprint(double(1 + 2))\n"
+    parse = lambda: Parser().parse(Lexer().parse(code))
+    assert isinstance(Optimizer(level=0).optimize(parse())[1].args[0], CallExpression), "Issue in running no passes at -O0."
+    assert pickle(Optimizer(level=1).optimize(parse())[1].args[0].args) == pickle([IntegerLiteral(3)]), "Issue in folding at -O1."
+    assert pickle(Optimizer(level=2).optimize(parse())[1].args) == pickle([IntegerLiteral(6)]), "Issue in inlining at -O2."
+
+    optimizer = Optimizer(True, level=2, time_passes=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+      optimizer.optimize(parse())
+    assert [(name, after) for name, _, _, after in optimizer.report] == [('fold', 11), ('inline', 9), ('prune', 3)], "Issue in reporting passes."
+
 class InterpreterTest(unittest.TestCase):
   def setUp(self):
     self.lexer = Lexer()
@@ -119,5 +244,677 @@ class InterpreterTest(unittest.TestCase):
     evaluated = self.interpreter.evaluate(parsed, self.env)[0]
     assert evaluated == 5, "Issue in arithmetic evaluation."
 
+  def test_tail_calls(self):
+    """Ensures tail calls don't grow the Python stack."""
+    code = "\n".join([
+      "fun down(let n) {\n  if (n <= 0) return 'done'\n  return down(n - 1)\n}",
+      "fun even(let n) {\n  if (n == 0) return 'even'\n  else return odd(n - 1)\n}",
+      "fun odd(let n) {\n  if (n == 0) {\n    return 'odd'\n  }\n  return even(n - 1)\n}",
+      "let a = down(20000)",
+      "let b = even(5001)",
+      ""
+    ])
+    parsed = self.optimizer.optimize(self.parser.parse(self.lexer.parse(code)))
+    self.interpreter.evaluate(parsed, self.env)
+    assert self.env.get_var('a').value == 'done', "Issue in tail recursion."
+    assert self.env.get_var('b').value == 'odd', "Issue in mutual tail recursion."
+
+  def test_tail_call_scope(self):
+    """Ensures a function tail called sees its caller's variables, as with any call."""
+    code = "const x = 1\nfun f() return x\nfun g(let x) return f()\nfun h(let y) return g(y + 1)\nlet a = g(2)\nlet b = h(4)\nlet c = f()\n"
+    self.interpreter.evaluate(self.parser.parse(self.lexer.parse(code)), self.env)
+    assert [self.env.get_var(name).value for name in 'abc'] == [2, 5, 1], "Issue in tail call scopes."
+
+class ClosureCompilerTest(unittest.TestCase):
+  def setUp(self):
+    self.lexer = Lexer()
+    self.parser = Parser()
+    self.optimizer = Optimizer()
+    self.compiler = ClosureCompiler()
+    self.env = Environment()
+    self.env.add_builtins()
+
+  def evaluate(self, code):
+    parsed = self.optimizer.optimize(self.parser.parse(self.lexer.parse(code)))
+    return self.compiler.evaluate(parsed, self.env)
+
+  def test_math(self):
+    """Ensures arithmetic is evaluated properly by compiled closures."""
+    evaluated = self.evaluate("4 + 2 / 2")[0]
+    assert evaluated == 5, "Issue in compiled arithmetic evaluation."
+
+  def test_recursion(self):
+    """Ensures recursive functions return through compiled conditionals."""
+    code = "fun fib(let n) {\n  if (n <= 1) return n\n  return fib(n - 2) + fib(n - 1)\n}\nlet a = fib(10)"
+    self.evaluate(code)
+    assert self.env.get_var('a').value == 55, "Issue in compiled function calls."
+
+  def test_early_return(self):
+    """Ensures a return inside a block stops the function."""
+    code = "fun f(let n) {\n  if (n > 1) {\n    let m = n * 2\n    return m\n  }\n  return 0\n}\nlet a = f(3)"
+    self.evaluate(code)
+    assert self.env.get_var('a').value == 6, "Issue in compiled return statements."
+
+class VMTest(unittest.TestCase):
+  def setUp(self):
+    self.lexer = Lexer()
+    self.parser = Parser()
+    self.optimizer = Optimizer()
+    self.vm = VM()
+    self.env = Environment()
+    self.env.add_builtins()
+
+  def compile(self, code):
+    parsed = self.optimizer.optimize(self.parser.parse(self.lexer.parse(code)))
+    return BytecodeCompiler().compile(parsed)
+
+  def test_math(self):
+    """Ensures arithmetic is evaluated properly by the VM."""
+    evaluated = self.vm.run(self.compile("4 + 2 / 2"), self.env)[0]
+    assert evaluated == 5, "Issue in bytecode arithmetic evaluation."
+
+  def test_deep_recursion(self):
+    """Ensures Jink calls do not nest Python frames in the VM."""
+    code = "fun down(let n) {\n  if (n <= 0) return 'done'\n  return down(n - 1)\n}\nlet a = down(5000)"
+    self.vm.run(self.compile(code), self.env)
+    assert self.env.get_var('a').value == 'done', "Issue in bytecode function calls."
+
+  def test_serialization(self):
+    """Ensures compiled programs survive a round trip through bytes."""
+    code = "fun add(let a, let b) return a + b\nlet a = add(1, 2)"
+    program = Code.loads(self.compile(code).dumps())
+    self.vm.run(program, self.env)
+    assert self.env.get_var('a').value == 3, "Issue in bytecode serialization."
+
+  def test_constants(self):
+    """Ensures constants and names are stored once per unit, with equal values of other types kept apart."""
+    code = "let a = 1\nlet b = 1.0\nlet c = 1 < 2\nlet d = 1\nlet e = { x: 'y' }\nlet f = { x: 'y' }\nfun g() return a + 1\nlet a = 'a'\n"
+    unit = self.compile(code)
+    assert unit.consts == [1, 1.0, True, { 'x': 'y' }, 'a'], "Issue in storing constants."
+    assert unit.names == ['a', 'b', 'c', 'd', 'e', 'f'], "Issue in storing names."
+    assert unit.functions[0].consts == [1] and unit.functions[0].names == ['a'], "Issue in storing function constants."
+
+class ResolverTest(unittest.TestCase):
+  def setUp(self):
+    self.lexer = Lexer()
+    self.parser = Parser()
+    self.optimizer = Optimizer()
+    self.interpreter = Interpreter()
+    env = Environment()
+    env.add_builtins()
+    self.resolver = Resolver(env)
+
+  def resolve(self, code):
+    return self.resolver.resolve(self.optimizer.optimize(self.parser.parse(self.lexer.parse(code))))
+
+  def test_addresses(self):
+    """Ensures identifiers are rewritten to frame addresses."""
+    resolved = self.resolve("let a = 1\nfun f(let b) return a + b\n")
+    body = resolved[1].body[0].value
+    assert (body.left.depth, body.left.slot) == (1, resolved[0].ident.slot), "Issue in global addressing."
+    assert (body.right.depth, body.right.slot) == (0, 0), "Issue in parameter addressing."
+
+  def test_evaluation(self):
+    """Ensures resolved programs run on frames."""
+    code = "fun fib(let n) {\n  if (n <= 1) return n\n  return fib(n - 2) + fib(n - 1)\n}\nlet a = fib(10)"
+    resolved = self.resolve(code)
+    self.interpreter.evaluate(resolved, self.resolver.frame)
+    assert self.resolver.frame.slots[resolved[-1].ident.slot].value == 55, "Issue in resolved evaluation."
+
+  def test_errors(self):
+    """Ensures name errors are raised before the program runs."""
+    with self.assertRaises(Exception, msg="Issue in undefined name detection."):
+      self.resolve("print(b)")
+    with self.assertRaises(Exception, msg="Issue in constant reassignment detection."):
+      self.resolve("const c = 1\nfun f() {\n  c = 2\n}")
+
+  def test_branches(self):
+    """Ensures each branch of a conditional can define the same name."""
+    code = "let a = 2\nlet b = 0\nif (a == 1) {\n  let x = 1\n  b = x\n} elseif (a == 2) {\n  let x = 2\n  b = x\n} else {\n  let x = 3\n  b = x\n}\n"
+    resolved = self.resolve(code)
+    self.interpreter.evaluate(resolved, self.resolver.frame)
+    assert self.resolver.frame.slots[resolved[1].ident.slot].value == 2, "Issue in resolving conditional branches."
+    with self.assertRaises(Exception, msg="Issue in scoping names defined in branches."):
+      self.resolve("let c = 1\nif (c == 1) {\n  let y = 1\n}\nprint(y)\n")
+
+class ModuleTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.dir = Path(self.tmp.name)
+    self.env = Environment()
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def write(self, name, code):
+    (self.dir / f"{name}.jk").write_text(code)
+
+  def run_code(self, code, interpreter):
+    parsed = Optimizer().optimize(Parser().parse(Lexer().parse(code)))
+    return interpreter.evaluate(parsed, self.env, file_dir=self.dir)
+
+  # Run code resolved to frames, returning a lookup of its globals
+  def run_resolved(self, code):
+    resolver = Resolver(Environment(), self.dir)
+    parsed = Optimizer().optimize(Parser().parse(Lexer().parse(code)))
+    Interpreter().evaluate(resolver.resolve(parsed), resolver.frame, file_dir=self.dir)
+    return lambda name: resolver.frame.slots[resolver.scope.find(name)[1]].value
+
+  def test_reimport(self):
+    """Ensures a module is parsed and evaluated once however often it is imported."""
+    self.write('helper', "let x = 2\nfun double(let n) return n * 2\n")
+    code = "import helper\nimport helper\nfun f() {\n  import helper\n  return double(x)\n}\nlet a = f()\nlet b = f()\n"
+    interpreter = Interpreter()
+    self.run_code(code, interpreter)
+    assert self.env.get_var('b').value == 4, "Issue in repeated module imports."
+    assert list(interpreter.modules.exports.values())[0][1].keys() == {'x', 'double'}, "Issue in module exports."
+
+    ast = AST_CACHE[(self.dir / 'helper.jk').resolve()][1]
+    self.env = Environment()
+    self.run_code("import helper\n", VM())
+    assert AST_CACHE[(self.dir / 'helper.jk').resolve()][1] is ast, "Issue in module AST cache."
+
+    self.write('other', "import helper\nlet y = x + 1\n")
+    value = self.run_resolved(code + "import other\nlet c = y + b\n")
+    assert value('b') == 4 and value('c') == 7, "Issue in repeated resolved module imports."
+
+  def test_cycle(self):
+    """Ensures modules importing each other don't recurse."""
+    self.write('first', "import second\nlet a = 1\n")
+    self.write('second', "import first\nlet b = 2\n")
+    for interpreter in (Interpreter(), ClosureCompiler(), VM()):
+      self.env = Environment()
+      self.run_code("import first\n", interpreter)
+      assert self.env.get_var('a').value == 1 and self.env.get_var('b').value == 2, "Issue in circular imports."
+
+    value = self.run_resolved("import first\n")
+    assert value('a') == 1 and value('b') == 2, "Issue in circular resolved imports."
+
+class CacheTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.path = Path(self.tmp.name) / 'main.jk'
+    self.code = "fun f(let a, let b) {\n  if (a > b) return a\n  return b\n}\nlet o = { x: 'y' }\nlet c = f(1, 2)\n"
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_round_trip(self):
+    """Ensures ASTs read back from the cache match the ones written."""
+    ast = cache.load_ast(self.path, self.code)
+    assert cache.cache_path(self.path).is_file(), "Issue in writing cache entries."
+    cached = cache.read_cache(cache.cache_path(self.path), cache.source_key(self.code, False, 2))
+    assert pickle(cached) == pickle(ast), "Issue in reading cache entries."
+
+  def test_invalid(self):
+    """Ensures stale and damaged cache entries are ignored."""
+    cache.load_ast(self.path, self.code)
+    entry = cache.cache_path(self.path)
+    assert cache.read_cache(entry, cache.source_key(self.code + "c\n", False)) is None, "Issue in rejecting stale cache entries."
+
+    data = bytearray(entry.read_bytes())
+    data[-3] ^= 0xff
+    entry.write_bytes(bytes(data))
+    assert cache.read_cache(entry, cache.source_key(self.code, False, 2)) is None, "Issue in rejecting damaged cache entries."
+    assert pickle(cache.load_ast(self.path, self.code)) == pickle(cache.front_end(self.code)), "Issue in replacing damaged cache entries."
+
+  def test_magic(self):
+    """Ensures entries written under an older magic are ignored rather than served."""
+    code = "let a = !true\nlet b = '' + ''\n"
+    cache.load_ast(self.path, code)
+    entry = cache.cache_path(self.path)
+    data = bytearray(entry.read_bytes())
+    data[len(cache.MAGIC) - 1] -= 1
+    entry.write_bytes(bytes(data))
+    assert cache.read_cache(entry, cache.source_key(code, False, 2)) is None, "Issue in rejecting old cache entries."
+    values = [expr.value.value for expr in cache.load_ast(self.path, code)]
+    assert values == ['false', ''], "Issue in replacing old cache entries."
+
+class MemoTest(unittest.TestCase):
+  def parse(self, code):
+    return Optimizer().optimize(Parser().parse(Lexer().parse(code)))
+
+  def test_purity(self):
+    """Ensures only functions depending on nothing but their arguments are flagged pure."""
+    code = "\n".join([
+      "let g = 1",
+      "fun sq(let n) return n * n",
+      "fun local(let n) {\n  let m = sq(n)\n  return string(m)\n}",
+      "fun reads(let n) return n + g",
+      "fun writes(let n) {\n  g = n\n}",
+      "fun prints(let n) {\n  print(n)\n}",
+      "fun calls(let n) return prints(n)",
+      "fun branch(let n) {\n  if (n > 100) {\n    let g = 0\n  }\n  return n + g\n}",
+      "fun before(let n) {\n  let m = n + g\n  let g = 2\n  return m\n}",
+      "fun loop(let n) {\n  let t = 0\n  for (let i = 0; i < n; i++) {\n    let s = i * 2\n    t = t + s\n  }\n  return t\n}",
+      ""
+    ])
+    pure = { func.name for func in find_pure(self.parse(code)) }
+    assert pure == { 'sq', 'local', 'loop' }, "Issue in purity analysis."
+
+    code = "let g = 1\nfun f(let n) {\n  if (n > 100) {\n    let g = 0\n  }\n  return n + g\n}\nlet a = f(5)\ng = 6\nlet b = f(5)\n"
+    interpreter = Interpreter()
+    interpreter.memo = Memo()
+    env = Environment()
+    interpreter.evaluate(self.parse(code), env)
+    assert env.get_var('b').value == 11, "Issue in memoizing functions that read globals."
+
+  def test_memoized_calls(self):
+    """Ensures pure recursive functions are called once per argument."""
+    code = "fun fib(let n) {\n  if (n <= 1) return n\n  return fib(n - 2) + fib(n - 1)\n}\nlet a = fib(60)\n"
+    interpreter = Interpreter()
+    interpreter.memo = Memo()
+    env = Environment()
+    interpreter.evaluate(self.parse(code), env)
+    assert env.get_var('a').value == 1548008755920, "Issue in memoized function calls."
+    assert interpreter.memo.misses == 61 and interpreter.memo.hits == 58, "Issue in memoization hit rate."
+
+class BenchmarkTest(unittest.TestCase):
+  def test_run(self):
+    """Ensures every phase of a benchmark is timed."""
+    results = run_benchmarks(['scopes'], backend='vm', repeat=1)
+    phases = results['benchmarks']['scopes']
+    assert set(phases) == {'lex', 'parse', 'optimize', 'evaluate', 'total'}, "Issue in timing benchmark phases."
+    assert phases['total']['min'] >= phases['evaluate']['min'] > 0, "Issue in timing benchmark phases."
+
+  def test_compare(self):
+    """Ensures slowdowns over the threshold are flagged and noise under the floor isn't."""
+    timed = lambda evaluate, lex: { 'benchmarks': { 'a': {
+      'lex': { 'min': lex }, 'parse': { 'min': 0.01 }, 'optimize': { 'min': 0.01 },
+      'evaluate': { 'min': evaluate }, 'total': { 'min': evaluate + lex + 0.02 }
+    } } }
+    rows = compare(timed(1.0, 0.0001), timed(1.2, 0.0002))
+    assert [row[1] for row in regressions(rows, 0.1)] == ['evaluate', 'total'], "Issue in flagging regressions."
+    assert regressions(rows, 0.5) == [], "Issue in regression threshold."
+
+class ProfilerTest(unittest.TestCase):
+  def profile(self, code, interpreter):
+    env = Environment()
+    env.add_builtins()
+    profiler = interpreter.profiler = Profiler()
+    profiler.start()
+    interpreter.evaluate(Parser().parse(Lexer().parse(code)), env)
+    profiler.stop()
+    return { s.label: s for s in profiler.report() }, profiler
+
+  def test_stats(self):
+    """Ensures calls and inclusive and exclusive time are recorded per function."""
+    code = "fun leaf(let n) return n\nfun mid(let n) {\n  leaf(n)\n  return leaf(n) + 0\n}\nmid(1)\nmid(2)\n"
+    for interpreter in (Interpreter(), ClosureCompiler()):
+      stats, profiler = self.profile(code, interpreter)
+      assert stats['leaf:1'].calls == 4 and stats['mid:2'].calls == 2, "Issue in counting calls."
+      assert stats['mid:2'].inclusive >= stats['mid:2'].exclusive + stats['leaf:1'].inclusive * 0.99, "Issue in exclusive time."
+      assert "<program>;mid:2;leaf:1 " in profiler.folded(), "Issue in folded stacks."
+
+  def test_recursion(self):
+    """Ensures recursive calls aren't counted twice in inclusive time."""
+    stats, profiler = self.profile("fun f(let n) {\n  if (n == 0) return 0\n  return f(n - 1) + 1\n}\nf(20)\n", Interpreter())
+    assert stats['f:1'].calls == 21, "Issue in counting recursive calls."
+    assert stats['f:1'].inclusive <= profiler.elapsed, "Issue in inclusive time of recursive calls."
+    node, depth = profiler.root, 0
+    while node.children:
+      node, depth = node.children['f:1'], depth + 1
+    assert depth == 21, "Issue in recursive call stacks."
+
+class TracingTest(unittest.TestCase):
+  def trace(self, code, *events):
+    tracer, seen = Tracer(), []
+    tracer.add_hook(seen.append, *events)
+    env = TracedEnvironment(tracer=tracer)
+    env.add_builtins()
+    TracingInterpreter(tracer).evaluate(Parser().parse(Lexer().parse(code)), env)
+    return seen, env
+
+  def test_events(self):
+    """Ensures hooks receive the events they registered for."""
+    seen, env = self.trace("fun add(let a, let b) return a + b\nlet c = add(1, 2)\n", CallEnter, CallExit, VariableSet)
+    assert [type(e).__name__ for e in seen] == ['CallEnter', 'VariableSet', 'VariableSet', 'CallExit', 'VariableSet'], "Issue in emitting events."
+    assert seen[0].name == 'add' and seen[0].args == [1, 2] and seen[3].value == 3, "Issue in call events."
+    assert isinstance(env.extend('call').find_scope('c'), TracedEnvironment), "Issue in extending traced scopes."
+
+  def test_lookups(self):
+    """Ensures lookups report the scope a name was found in."""
+    seen, env = self.trace("let a = 1\nlet b = a\n", ScopeLookup)
+    found = [e.found for e in seen if e.name == 'a']
+    assert found[0] is None and found[-1] is env, "Issue in lookup events."
+    assert not hasattr(Environment(), 'tracer'), "Issue in keeping tracing out of untraced scopes."
+
+class REPLTest(unittest.TestCase):
+  def repl(self, code):
+    out = io.StringIO()
+    repl = REPL(io.StringIO(code), out)
+    with contextlib.redirect_stdout(out):
+      repl.main_loop()
+    return repl, out.getvalue()
+
+  def test_multi_line(self):
+    """Ensures input runs once its brackets are closed."""
+    repl, out = self.repl("fun add(let a, let b) {\n  return a + b\n}\nprint(add(1,\n  2))\n")
+    assert "> ... ... " in out and "... 3\n" in out, "Issue in multi-line input."
+    assert repl.pending == [] and repl.depth == 0, "Issue in finishing multi-line input."
+
+  def test_isolation(self):
+    """Ensures each REPL gets its own environment and keeps definitions between inputs."""
+    first, _ = self.repl("let a = 1\n")
+    second, out = self.repl("a\n")
+    assert "a is not defined" in out and first.env is not second.env, "Issue in isolating REPL environments."
+    assert first.interpreter is not second.interpreter, "Issue in isolating REPL interpreters."
+
+  def test_optimizer_state(self):
+    """Ensures constants and functions carry over to later inputs only once they ran."""
+    repl, out = self.repl("const a = 2\nfun f(let x) return x * a\nconst a = 3\nf(4)\n")
+    assert "already defined" in out and "> 8\n" in out, "Issue in keeping optimizer state."
+    assert pickle(repl.optimizer.bindings['a']) == pickle(IntegerLiteral(2)), "Issue in discarding failed definitions."
+
+class DocumentTest(unittest.TestCase):
+  def full(self, code):
+    return pickle(Parser().parse(Lexer().tokenize(code)))
+
+  def test_edit(self):
+    """Ensures an edit only reparses the statements around it."""
+    code = ''.join(f"let v{i} = {i}\n" for i in range(100)) + "fun f(let x) {\n  return x\n}\n"
+    doc = Document(code)
+    ast = doc.edit(code.index("v50 = ") + 6, 2, "'changed'")
+    assert pickle(ast) == self.full(doc.text), "Issue in reparsing an edit."
+    assert doc.relexed < 60, "Issue in limiting the reparsed source."
+
+    doc.edit(0, 0, "// first\n\n")
+    assert doc.ast[-1].line == 103 and pickle(doc.ast) == self.full(doc.text), "Issue in moving later statements."
+
+  def test_escaped_lines(self):
+    """Ensures lines counted for escaped line breaks in strings carry through edits."""
+    doc = Document("let a = 1\n\"a\\nb\"\nlet b = 2\nfun f() return 1\n")
+    doc.edit(doc.text.index("let b"), 0, "let c = 3\n")
+    doc.edit(doc.text.index("2"), 1, "4")
+    assert doc.ast[-1].line == 6 and pickle(doc.ast) == self.full(doc.text), "Issue in lines after escaped line breaks."
+
+  def test_continued(self):
+    """Ensures edits that carry a statement on into the next one reparse both."""
+    doc = Document("if (a) {\n  print(1)\n}\nprint(2)\n")
+    doc.edit(doc.text.index("print(2)"), 0, "else {\n  print(3)\n}\n")
+    assert len(doc.ast) == 2 and doc.ast[0].else_body, "Issue in attaching an else."
+
+    doc.edit(doc.text.index("print(2)") + 7, 1, "")
+    assert doc.text.endswith("print(2\n") and pickle(doc.ast) == self.full(doc.text), "Issue in reparsing an unclosed call."
+
+  def test_error(self):
+    """Ensures parse errors are raised until the source parses again."""
+    doc = Document("let a = 1\nprint(a)\n")
+    with self.assertRaises(Exception):
+      doc.edit(doc.text.index("1"), 1, "(")
+    assert doc.error is not None, "Issue in keeping a parse error."
+    assert pickle(doc.edit(doc.text.index("("), 1, "2")) == self.full("let a = 2\nprint(a)\n"), "Issue in recovering from a parse error."
+
+class BatchTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.dir = Path(self.tmp.name)
+    (self.dir / "a.jk").write_text("print('a')\n")
+    (self.dir / "b.jk").write_text("print(1)\nprint(x)\n")
+    (self.dir / "manifest").write_text("b.jk\n\na.jk\n")
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_find_scripts(self):
+    """Ensures scripts are found in directories and manifests."""
+    assert [p.name for p in find_scripts(self.dir)] == ['a.jk', 'b.jk'], "Issue in finding scripts in a directory."
+    assert [p.name for p in find_scripts(self.dir / "manifest")] == ['b.jk', 'a.jk'], "Issue in reading a manifest."
+
+  def test_run_batch(self):
+    """Ensures each script's output and status are kept separately."""
+    first, second = run_batch(find_scripts(self.dir), workers=2)
+    assert first.status == 0 and first.output == "a\n" and first.error is None, "Issue in running a script."
+    assert second.status == 1 and second.output == "1\n" and "x is not defined" in second.error, "Issue in reporting a failed script."
+    assert first.seconds > 0 and second.seconds > 0, "Issue in timing scripts."
+
+class ProgramTest(unittest.TestCase):
+  code = "fun score(let x) {\n  return x * weight + bonus(x)\n}\nlet result = score(value)\n"
+
+  def run_program(self, program, **globals):
+    env = Environment()
+    env.add_builtins()
+    program.run(globals, env)
+    return env.get_var('result').value
+
+  def test_run_many(self):
+    """Ensures a compiled program runs with new globals each time without changing its AST, inline caches aside."""
+    program = jink.compile(self.code)
+    before = cache.encode(program.ast)
+    assert self.run_program(program, value=1, weight=10, bonus=lambda x: x * 100) == 110, "Issue in running a program."
+    assert self.run_program(program, value=2, weight=3, bonus=lambda x: 0) == 6, "Issue in running a program again."
+    assert cache.encode(program.ast) == before, "Issue in keeping the program's AST."
+
+  def test_backends(self):
+    """Ensures programs run the same on every backend."""
+    for backend in ('closures', 'vm'):
+      program = jink.compile(self.code, backend)
+      assert self.run_program(program, value=2, weight=3, bonus=lambda x: 1) == 7, f"Issue in running a program on {backend}."
+    with self.assertRaises(Exception):
+      jink.compile(self.code, 'compiler')
+
+class BudgetTest(unittest.TestCase):
+  def run_code(self, code, budget):
+    env = Environment()
+    env.add_builtins()
+    ast = Optimizer().optimize(Parser().parse(Lexer().tokenize(code)))
+    return BudgetedInterpreter(budget).evaluate(ast, env)
+
+  def test_limits(self):
+    """Ensures runaway scripts stop with BudgetExceeded."""
+    recursion = "fun f(let n) {\n  return 1 + f(n + 1)\n}\nf(0)\n"
+    loop = "fun g(let n) {\n  return g(n + 1)\n}\ng(0)\n"
+    with self.assertRaises(BudgetExceeded) as caught:
+      self.run_code(recursion, Budget(max_depth=20))
+    assert caught.exception.limit == 'depth', "Issue in limiting call depth."
+
+    with self.assertRaises(BudgetExceeded) as caught:
+      self.run_code(loop, Budget(max_depth=5, max_nodes=3000))
+    assert caught.exception.limit == 'nodes', "Issue in limiting node evaluations."
+
+    for budget in (Budget(), Budget(max_depth=100000)):
+      with self.assertRaises(BudgetExceeded) as caught:
+        self.run_code(recursion, budget)
+      assert caught.exception.limit == 'depth', "Issue in limiting call depth to the host stack."
+
+  def test_deadline(self):
+    """Ensures the clock is only read every so often and stops the run once past the deadline."""
+    reads = []
+    def clock():
+      reads.append(None)
+      return len(reads)
+    with self.assertRaises(BudgetExceeded) as caught:
+      self.run_code("fun g(let n) {\n  return g(n + 1)\n}\ng(0)\n", Budget(timeout=3, clock=clock))
+    assert caught.exception.limit == 'timeout' and len(reads) == 4, "Issue in checking the deadline."
+
+  def test_within_budget(self):
+    """Ensures scripts within their budget run as usual, with the budget starting over each run."""
+    program = jink.compile("let a = 1 + 2\nlet b = a * 2\n")
+    budget = Budget(max_nodes=10, max_depth=2, timeout=5)
+    for _ in range(3):
+      assert program.run(budget=budget) == [3, 6], "Issue in running within budget."
+
+class AsyncTest(unittest.TestCase):
+  def test_run(self):
+    """Ensures programs give the same results run asynchronously."""
+    code = "fun count(let n, let total) {\n  if (n == 0) {\n    return total\n  }\n  return count(n - 1, total + n)\n}\nlet a = count(200, 0)\nlet b = 2 * 3 + 1\n"
+    program = jink.compile(code)
+    assert asyncio.run(aio.run(program))[1:] == program.run()[1:] == [20100, 7], "Issue in running asynchronously."
+
+  def test_concurrent(self):
+    """Ensures scripts waiting on awaitable functions let others run meanwhile."""
+    events = []
+    async def fetch(name):
+      events.append(f"start {name}")
+      await asyncio.sleep(0.01)
+      events.append(f"end {name}")
+      return 1
+
+    async def main():
+      program = jink.compile("sleep(0)\nlet result = fetch(name) + 1\n")
+      return await asyncio.gather(*(aio.run(program, globals={ 'name': name, 'fetch': fetch }) for name in 'ab'))
+
+    assert [r[-1] for r in asyncio.run(main())] == [2, 2], "Issue in awaiting functions."
+    assert events == ["start a", "start b", "end a", "end b"], "Issue in running scripts concurrently."
+
+class ValuesTest(unittest.TestCase):
+  def run_code(self, code, backend):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+      result = jink.compile(code, backend).run()
+    return result, output.getvalue()
+
+  def test_cells(self):
+    """Ensures variables are cells whose type follows their value."""
+    env = Environment()
+    env.set_var('a', 1, 'let')
+    cell = env.get_var('a')
+    assert type(cell) is Cell and cell.type == 'int', "Issue in variable cells."
+    env.set_var('a', True)
+    assert cell.value is True and cell.type == 'bool' and cell.var_type == 'let', "Issue in reassigning cells."
+
+  def test_native_values(self):
+    """Ensures booleans and null are Python values, written as Jink's only when printed."""
+    code = "let a = 1 < 2\nlet b = null\nlet c = 'null'\nprint(a)\nprint(b)\nprint('is ' + !a)\nprint(c)\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      result, output = self.run_code(code, backend)
+      assert result[:3] == [True, NULL, 'null'], f"Issue in native values on {backend}."
+      assert output == "true\nnull\nis false\nnull\n", f"Issue in printing native values on {backend}."
+
+  def test_conditions(self):
+    """Ensures conditions test native truth, not the text of a value."""
+    code = "let a = 'false'\nlet b = 1 > 2\nif (a) {\n  print('a')\n}\nif (!b) {\n  print('b')\n}\nif (null) {\n  print('c')\n}\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      assert self.run_code(code, backend)[1] == "a\nb\n", f"Issue in conditions on {backend}."
+
+  def test_null(self):
+    """Ensures null compares and concatenates the same on every backend."""
+    code = (
+      "let a = null\nlet b = a == null\nfun f(let x: null) {\n  return x == null\n}\n"
+      "let c = f()\nlet d = 'x' + null\nlet e;\nlet g = e == a\n"
+    )
+    for backend in ('interpreter', 'closures', 'vm'):
+      result = self.run_code(code, backend)[0]
+      assert result[:2] == [NULL, True] and result[3:] == [True, 'xnull', NULL, True], f"Issue in null values on {backend}."
+
+class InlineCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.env = Environment()
+    self.env.add_builtins()
+
+  def test_specialize(self):
+    """Ensures operators cache the operand type they see and fall back when it changes."""
+    expr = Parser().parse(Lexer().tokenize("a + b\n"))[0]
+    interpreter = Interpreter()
+    interpreter.env = self.env
+    for a, b, result in ((1, 2, 3), (1.5, 2.0, 3.5), ('x', 'y', 'xy'), ('x', True, 'xtrue'), (2, 3, 5)):
+      self.env.index.clear()
+      self.env.set_var('a', a, 'let')
+      self.env.set_var('b', b, 'let')
+      assert interpreter.evaluate_top(expr) == result, "Issue in specialized operators."
+      if type(a) is type(b):
+        assert expr.cache[0] is type(a), "Issue in caching operand types."
+
+  def test_backends(self):
+    """Ensures cached operations give the same results on every backend."""
+    code = "fun f(let x, let y) {\n  return -x * 2 + y < 10\n}\nlet a = f(1, 2)\nlet b = f(1.5, 20.0)\nlet c = f(3, 2.5)\nlet d = !a\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      program = jink.compile(code, backend)
+      assert program.run()[1:] == [True, False, True, False], f"Issue in cached operations on {backend}."
+
+class LoopTest(unittest.TestCase):
+  code = (
+    "fun count(let n) {\n  let total = 0\n  for (let i = 0; i < n; i++) {\n    let step = i\n"
+    "    if (i == 3) {\n      continue\n    }\n    if (step > 5000) {\n      return total\n    }\n"
+    "    total = total + step\n  }\n  return total\n}\n"
+    "let a = count(10)\nlet b = count(20000)\nlet c = 0\nwhile (true) {\n  c = c + 1\n"
+    "  if (c == 7) {\n    break\n  }\n}\n"
+  )
+
+  def test_parse(self):
+    """Ensures for loop headers are parsed, and break and continue only inside loops."""
+    loop = Parser().parse(Lexer().tokenize("for (let i = 0; i < 3; i++) print(i)\n"))[0]
+    assert loop.type == 'for' and loop.init.type == 'let', "Issue in parsing for loops."
+    assert loop.step.ident.name == 'i' and loop.step.value.operator == '+', "Issue in parsing loop increments."
+    assert Parser().parse(Lexer().tokenize("for (;;) {\n  break\n}\n"))[0].condition.value == 'true', "Issue in parsing empty for loop headers."
+    for step, operator in (("++i", '+'), ("--i", '-')):
+      loop = Parser().parse(Lexer().tokenize(f"for (let i = 0; i < 2; {step}) print(i)\n"))[0]
+      assert loop.condition.operator == '<' and loop.step.value.operator == operator, "Issue in parsing prefix loop increments."
+    for code in ("break\n", "while (true) {\n  fun f() {\n    continue\n  }\n}\n"):
+      with self.assertRaises(Exception, msg="Issue in rejecting break and continue outside of loops."):
+        Parser().parse(Lexer().tokenize(code))
+
+  def test_backends(self):
+    """Ensures loops, break, continue and returns from loops run the same on every backend."""
+    expected = [42, 12502497, 7]
+    for backend in ('interpreter', 'closures', 'vm'):
+      env = Environment()
+      env.add_builtins()
+      jink.compile(self.code, backend).run(env=env)
+      assert [env.get_var(name).value for name in 'abc'] == expected, f"Issue in running loops on {backend}."
+
+    env = Environment()
+    env.add_builtins()
+    asyncio.run(aio.run(jink.compile(self.code), env))
+    assert [env.get_var(name).value for name in 'abc'] == expected, "Issue in running loops asynchronously."
+
+    resolver = Resolver(Environment())
+    resolved = resolver.resolve(Optimizer().optimize(Parser().parse(Lexer().tokenize(self.code))))
+    Interpreter().evaluate(resolved, resolver.frame)
+    assert resolver.frame.slots[resolved[2].ident.slot].value == 12502497, "Issue in running resolved loops."
+
+  def test_empty_header_parts(self):
+    """Ensures any part of a for loop's header can be left out, on every backend."""
+    headers = {
+      "let i = 0; ; i++": (True, True, True), ";;": (False, True, False), "; i < 5;": (False, False, False),
+      "let i = 0;;": (True, True, False), ";; i++": (False, True, True)
+    }
+    for header, (init, forever, step) in headers.items():
+      loop = Parser().parse(Lexer().tokenize(f"for ({header}) {{\n  break\n}}\n"))[0]
+      assert (loop.init is not None, getattr(loop.condition, 'value', None) == 'true', loop.step is not None) == (init, forever, step), f"Issue in parsing 'for ({header})'."
+
+    code = "let t = 0\nlet j = 0\nfor (let i = 0; ; i++) {\n  if (i == 3) {\n    break\n  }\n  t = t + 1\n}\nfor (;; j++) {\n  if (j == 4) {\n    break\n  }\n  t = t + 1\n}\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      env = Environment()
+      env.add_builtins()
+      jink.compile(code, backend).run(env=env)
+      assert env.get_var('t').value == 7, f"Issue in running loops with empty conditions on {backend}."
+
+  def test_prefix_steps(self):
+    """Ensures for loops stepping with ++i and --i run the same on every backend."""
+    code = "let t = 0\nfor (let i = 0; i < 4; ++i) {\n  t = t + i\n}\nfor (let i = 3; i > 0; --i) {\n  t = t * i\n}\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      env = Environment()
+      env.add_builtins()
+      jink.compile(code, backend).run(env=env)
+      assert env.get_var('t').value == 36, f"Issue in prefix loop steps on {backend}."
+
+  def test_top_level_return(self):
+    """Ensures a return from a top level loop ends that statement on every backend."""
+    code = "let i = 0\nwhile (i < 3) {\n  i = i + 1\n  print(i)\n  return 1\n}\nprint('end')\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      output = io.StringIO()
+      with contextlib.redirect_stdout(output):
+        result = jink.compile(code, backend).run()
+      assert output.getvalue() == "1\nend\n", f"Issue in returning from top level loops on {backend}."
+      assert result[1] == { 'type': 'return', 'value': 1 }, f"Issue in top level return values on {backend}."
+
+  def test_scope(self):
+    """Ensures a loop's body scope is made once and what the loop defines stays inside it."""
+    scopes = []
+    class CountingEnvironment(Environment):
+      def extend(self, s_type):
+        scopes.append(s_type)
+        return super().extend(s_type)
+
+    code = "let t = 0\nfor (let i = 0; i < 5; i++) {\n  let x = i\n  t = t + x\n}\nfor (let i = 0; i < 2; i++) {\n}\n"
+    for backend in ('interpreter', 'closures', 'vm'):
+      scopes.clear()
+      env = CountingEnvironment()
+      env.add_builtins()
+      jink.compile(code, backend).run(env=env)
+      assert env.get_var('t').value == 10 and 'i' not in env.index, f"Issue in loop scopes on {backend}."
+      assert scopes == ['loop', 'loop_body'] * 2, f"Issue in reusing loop scopes on {backend}."
+
 if __name__ == "__main__":
   unittest.main() # run all tests